@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+'''
+BENCHMARK: FAST MULTIPOLE SCALING
+
+This benchmark compares the scaling of the fast multipole solver against direct summation.
+Each system is a cluster of massive bodies with normally distributed positions.
+The direct summation time for large systems is extrapolated from a sample of the targets,
+since evaluating every pair at once would not fit in memory.
+
+NOTE:
+The largest systems take a few minutes to set up and evaluate.
+'''
+
+# Include previous directory
+import sys
+sys.path.append("../")
+
+# Import all needed packages
+import random
+from datetime import datetime
+from modules.body import Body
+from modules.cluster import Cluster
+from modules.system import System
+from modules.solver import *
+from modules.model import *
+from modules.color import Color
+
+
+##########################################################################
+# PARAMETERS
+##########################################################################
+
+n_bodies    = [1000, 3000, 10000, 30000, 100000]    # The number of bodies to test
+orders      = [2, 4, 6]                             # The expansion orders to test
+max_pairs   = 2000000                               # The maximum pairs to evaluate directly at once
+
+
+##########################################################################
+# BENCHMARK
+##########################################################################
+
+# Returns a random normally distributed position
+def random_callback (cluster: Cluster, index: int, body: Body) -> State:
+    return State(Vector(random.gauss(0, 1), random.gauss(0, 1), random.gauss(0, 1)), Vector(), Vector())
+
+# Print the header
+Color.print("\nFast Multipole Scaling", Color.HEADER)
+print("\t       N\t    direct [s]\t" + "\t".join(["order %d [s]\t   acc error" % order for order in orders]))
+
+# Stores the crossover point for each order
+crossover = {}
+
+# Loop through each of the system sizes
+random.seed(1)
+for n in n_bodies:
+
+    # Create the system
+    cluster = Cluster(KeplerModel(), n_bodies = n, masses = [1.0], init_callback = random_callback)
+    system = System(cluster, solver = FMMSolver())
+    particles = system.particles
+
+    # Time the direct summation on a sample of the targets and extrapolate
+    sample = np.arange(max(1, min(n, max_pairs // n)))
+    direct = DirectSolver()
+    start = datetime.now()
+    a_direct = direct.accelerations(particles, sample)
+    duration_direct = (datetime.now() - start).total_seconds() * n / sample.size
+    output = "\t%8d\t%14.4f" % (n, duration_direct)
+
+    # Time each of the expansion orders
+    for order in orders:
+        fmm = FMMSolver(order = order)
+        start = datetime.now()
+        a, pot = fmm.evaluate(particles)
+        duration = (datetime.now() - start).total_seconds()
+
+        # Calculate the median relative error on the sample
+        error = np.median(np.linalg.norm(a[sample] - a_direct, axis=1) / np.linalg.norm(a_direct, axis=1))
+        output += "\t%12.4f\t%12.2e" % (duration, error)
+
+        # Store the first size where the fast multipole solver is faster
+        if duration < duration_direct and order not in crossover:
+            crossover[order] = n
+
+    print(output)
+
+# Print the crossover points
+Color.print("\nCrossover against direct summation", Color.HEADER)
+for order in orders:
+    if order in crossover:
+        print("\torder %d:  faster from N = %d" % (order, crossover[order]))
+    else:
+        print("\torder %d:  not faster for the sizes tested" % order)
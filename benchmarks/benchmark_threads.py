@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+'''
+BENCHMARK: THREAD SCALING
+
+This benchmark measures the scaling of the threaded direct summation solver
+with the number of threads. Each system is a cluster of massive bodies and a
+galaxy of massless bodies. The speedup is relative to a single thread, and the
+threaded accelerations are checked against the direct summation solver.
+'''
+
+# Include previous directory
+import sys
+sys.path.append("../")
+
+# Import all needed packages
+import random
+import numpy as np
+from datetime import datetime
+from modules.body import Body
+from modules.cluster import Cluster
+from modules.galaxy import Galaxy
+from modules.system import System
+from modules.solver import *
+from modules.model import *
+from modules.color import Color
+
+
+##########################################################################
+# PARAMETERS
+##########################################################################
+
+n_bodies    = [1000, 2000, 4000]    # The number of bodies to test
+threads     = [1, 2, 4, 8, 16, 32]  # The number of threads to test
+fraction    = 0.5                   # The fraction of bodies with mass
+repeats     = 3                     # The number of evaluations to average
+
+
+##########################################################################
+# BENCHMARK
+##########################################################################
+
+# Returns a random normally distributed position
+def random_callback (cluster: Cluster, index: int, body: Body) -> State:
+    return State(Vector(random.gauss(0, 10), random.gauss(0, 10), random.gauss(0, 10)), Vector(), Vector())
+
+# Print the header
+Color.print("\nThread Scaling", Color.HEADER)
+print("\t       N\t threads\t  time [s]\t   speedup\t max error")
+
+# Loop through each of the system sizes
+random.seed(1)
+for n in n_bodies:
+
+    # Create the cluster of massive bodies
+    n_massive = int(n * fraction)
+    cluster = Cluster(KeplerModel(), n_bodies = n_massive, masses = [1.0], init_callback = random_callback)
+
+    # Create the galaxy of massless bodies
+    galaxy = Galaxy(n_bodies = n - n_massive - 1, mass = 1.0, ring_spacing = 1)
+    galaxy_cluster = Cluster(KeplerModel(), n_bodies = galaxy.n_bodies, masses = galaxy.masses, init_callback = galaxy.init_callback)
+
+    # Create the system and the exact accelerations
+    system = System([cluster, galaxy_cluster])
+    exact = DirectSolver().accelerations(system.particles)
+
+    # Loop through each of the thread counts
+    single = None
+    for count in threads:
+        solver = ThreadSolver()
+        solver.start(system.particles, count)
+
+        # Measure the average duration of the evaluation
+        start = datetime.now()
+        for _ in range(repeats): acc = solver.accelerations(system.particles)
+        duration = (datetime.now() - start).total_seconds() / repeats
+        solver.stop(system.particles)
+
+        # Compare against a single thread and the direct summation
+        single = single if single else duration
+        error = np.max(np.abs(acc - exact))
+        print("\t%8d\t%8d\t%10.4f\t%10.2f\t%10.2e" % (n, count, duration, single / duration, error))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+'''
+BENCHMARK: DIRECT SUMMATION TILES
+
+This benchmark measures the duration and peak memory of the direct summation
+solver for a range of system sizes and tile sizes. Each system is a cluster of
+massive bodies and a galaxy of massless bodies, so both the symmetric tiles
+between the massive bodies and the tiles between the massless bodies and the
+massive bodies are used.
+'''
+
+# Include previous directory
+import sys
+sys.path.append("../")
+
+# Import all needed packages
+import random
+import tracemalloc
+from datetime import datetime
+from modules.body import Body
+from modules.cluster import Cluster
+from modules.galaxy import Galaxy
+from modules.system import System
+from modules.solver import *
+from modules.model import *
+from modules.color import Color
+
+
+##########################################################################
+# PARAMETERS
+##########################################################################
+
+n_bodies    = [1000, 4000, 16000]           # The number of bodies to test
+tile_sizes  = [32, 128, 256, 1024, 4096]    # The tile sizes to test
+fraction    = 0.5                           # The fraction of bodies with mass
+
+
+##########################################################################
+# BENCHMARK
+##########################################################################
+
+# Returns a random normally distributed position
+def random_callback (cluster: Cluster, index: int, body: Body) -> State:
+    return State(Vector(random.gauss(0, 10), random.gauss(0, 10), random.gauss(0, 10)), Vector(), Vector())
+
+# Print the header
+Color.print("\nDirect Summation Tiles", Color.HEADER)
+print("\t       N\t    tile\t  time [s]\t peak [MB]")
+
+# Loop through each of the system sizes
+random.seed(1)
+for n in n_bodies:
+
+    # Create the cluster of massive bodies
+    n_massive = int(n * fraction)
+    cluster = Cluster(KeplerModel(), n_bodies = n_massive, masses = [1.0], init_callback = random_callback)
+
+    # Create the galaxy of massless bodies
+    galaxy = Galaxy(n_bodies = n - n_massive - 1, mass = 1.0, ring_spacing = 1)
+    galaxy_cluster = Cluster(KeplerModel(), n_bodies = galaxy.n_bodies, masses = galaxy.masses, init_callback = galaxy.init_callback)
+
+    # Create the system
+    system = System([cluster, galaxy_cluster])
+
+    # Loop through each of the tile sizes
+    for tile_size in tile_sizes:
+        system.solver = DirectSolver(tile_size = tile_size)
+
+        # Measure the duration and the peak memory of the evaluation
+        tracemalloc.start()
+        start = datetime.now()
+        system.compute_forces()
+        duration = (datetime.now() - start).total_seconds()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+        print("\t%8d\t%8d\t%10.4f\t%10.2f" % (n, tile_size, duration, peak))
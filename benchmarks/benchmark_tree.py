@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+'''
+BENCHMARK: BARNES-HUT TREE ACCURACY
+
+This benchmark compares the Barnes-Hut tree solver against direct summation.
+A cluster of massive bodies is combined with a galaxy of massless test bodies,
+and the relative errors and durations are reported for a range of opening angles.
+'''
+
+# Include previous directory
+import sys
+sys.path.append("../")
+
+# Import all needed packages
+import random
+from datetime import datetime
+from modules.body import Body
+from modules.cluster import Cluster
+from modules.galaxy import Galaxy
+from modules.system import System
+from modules.solver import *
+from modules.model import *
+from modules.color import Color
+
+
+##########################################################################
+# PARAMETERS
+##########################################################################
+
+n_massive   = 2000                      # The number of massive bodies
+n_tracers   = 500                       # The number of massless bodies in the galaxy
+radius      = 20.0                      # The radius of the massive cluster
+thetas      = [0.3, 0.5, 0.7, 1.0]      # The opening angles to test
+
+
+##########################################################################
+# SET UP THE SYSTEM
+##########################################################################
+
+# Returns a random position inside a sphere for the massive bodies
+def random_callback (cluster: Cluster, index: int, body: Body) -> State:
+    while True:
+        x = Vector(random.uniform(-1, 1), random.uniform(-1, 1), random.uniform(-1, 1))
+        if x.mag <= 1.0: return State(x * radius, Vector(), Vector())
+
+# Create the massive cluster
+random.seed(1)
+cluster = Cluster(
+    KeplerModel(),
+    n_bodies = n_massive,
+    masses = [1.0],
+    init_callback = random_callback,
+)
+
+# Create the galaxy of massless bodies
+galaxy = Galaxy(n_bodies = n_tracers, mass = 1.0, ring_spacing = 2)
+galaxy_cluster = Cluster(
+    KeplerModel(),
+    n_bodies = galaxy.n_bodies,
+    masses = galaxy.masses,
+    init_callback = galaxy.init_callback,
+)
+
+# Create the system
+system = System([cluster, galaxy_cluster])
+particles = system.particles
+
+
+##########################################################################
+# ACCURACY REPORT
+##########################################################################
+
+# Time the direct summation, which calculates the accelerations and potentials together like the tree
+direct = DirectSolver()
+start = datetime.now()
+direct.evaluate(particles)
+duration_direct = (datetime.now() - start).total_seconds()
+
+Color.print("\nBarnes-Hut Accuracy (%d sources, %d bodies)" % (len(particles.sources), particles.n), Color.HEADER)
+print("\ttheta\t  time [s]\tacc median\t   acc 99%\t   acc max\tpot median\t   pot max")
+print("\tdirect\t%10.4f" % duration_direct)
+
+# Loop through each opening angle
+for theta in thetas:
+    tree = TreeSolver(theta = theta)
+
+    # Time the tree solver
+    start = datetime.now()
+    tree.evaluate(particles)
+    duration = (datetime.now() - start).total_seconds()
+
+    # Compare with direct summation
+    errors = tree.compare(particles, direct)
+    print("\t%4.2f\t%10.4f\t%10.2e\t%10.2e\t%10.2e\t%10.2e\t%10.2e" % (theta, duration, errors["acc_median"], \
+        errors["acc_p99"], errors["acc_max"], errors["pot_median"], errors["pot_max"]))
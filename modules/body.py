@@ -1,6 +1,7 @@
 from numpy import float64, sqrt, arctan2
 from .vector import Vector
 from .state import State
+from .particles import Particles, ParticleState
 from .model import *
 
 # Stores all information related to a body
@@ -42,6 +43,9 @@ class Body:
 
     # Initial energy
     init_energy = None
+
+    # The index of the body in the system particle arrays
+    index: int = 0
     
 
 
@@ -58,6 +62,11 @@ class Body:
         self.has_mass = mass > 0.1
         
 
+    # Binds the state of the body to a row of the system particle arrays
+    def bind (self, particles: Particles, index: int):
+        self.index = index
+        self.state = ParticleState(particles, index)
+
     # Resets the data
     def reset (self):
         self.init_energy = None
@@ -0,0 +1,172 @@
+import copy
+import numpy as np
+from numpy import float64
+from .system import System
+from .particles import Particles
+from .solver import EnsembleSolver
+from .vector import Vector
+
+# Stores many independent systems with the same number of bodies, so that they can be integrated together
+# The bodies of each member are consecutive rows of the particle arrays, which can be viewed as (K, N, 3)
+# The members only feel their own bodies and backgrounds, and each member keeps its own diagnostics
+class Ensemble (System):
+
+    ##########################################################################
+    # PARAMETERS
+    ##########################################################################
+
+    # A list of the member systems
+    systems: list = []
+
+    # The number of member systems
+    n_members: int = 0
+
+    # The number of bodies in each member
+    n_member_bodies: int = 0
+
+    # The groups of backgrounds, which are each evaluated in a single call (model, rows)
+    backgrounds: list = []
+
+
+    ##########################################################################
+    # ENSEMBLE FUNCTIONS
+    ##########################################################################
+
+    # Creates a new ensemble from a list of systems
+    def __init__ (self, systems: list, **kwargs):
+        self.systems = systems
+        self.__dict__.update(kwargs)
+        self.reset()
+
+
+    # Resets the member systems and stacks their bodies into the particle arrays
+    def reset (self):
+        if len(self.systems) == 0 or len(set([system.n_bodies for system in self.systems])) != 1:
+            raise Exception("Invalid ensemble systems used.")
+
+        # Resets the members
+        for system in self.systems: system.reset()
+        self.n_members = len(self.systems)
+        self.n_member_bodies = self.systems[0].n_bodies
+
+        # Gets all the clusters and bodies of the members
+        self.clusters = [cluster for system in self.systems for cluster in system.clusters]
+        self.n_clusters = len(self.clusters)
+        self.bodies = [body for system in self.systems for body in system.bodies]
+        self.n_bodies = len(self.bodies)
+        self.mass_total = sum([system.mass_total for system in self.systems])
+
+        # Stores the bodies in the particle arrays, and gives each member views onto its rows
+        self.particles = Particles(self.bodies)
+        for idx, system in enumerate(self.systems):
+            rows = self.get_rows(idx)
+            p = self.particles
+            system.particles = Particles.from_arrays(p.x[rows], p.mass[rows], p.has_mass[rows], p.v[rows], p.a[rows])
+
+        # Creates the solver, which must soften gravity in the same way for every member
+        solvers = [system.solver for system in self.systems]
+        if any([solver.softening != solvers[0].softening or solver.kernel != solvers[0].kernel for solver in solvers]):
+            raise Exception("Invalid ensemble solver used.")
+        self.solver = EnsembleSolver(members = self.n_members, softening = solvers[0].softening, kernel = solvers[0].kernel)
+
+        # Groups the backgrounds of the members
+        self.group_backgrounds()
+
+        # Sets the starting accelerations and potentials of the bodies
+        self.particles.a[:], self.particles.PE[:] = self.compute_forces()
+
+        # Sets the starting properties of the bodies
+        self.update_bodies(reset = True)
+
+
+    # Returns the rows of the particle arrays of some member
+    def get_rows (self, member: int) -> slice:
+        return slice(member * self.n_member_bodies, (member + 1) * self.n_member_bodies)
+
+
+    # Updates the properties of each member and the totals of the ensemble
+    # The energy error of the ensemble is the largest energy error of the members
+    def update (self):
+        for system in self.systems: system.update()
+        self.L = sum([cluster.L for cluster in self.clusters], Vector())
+        self.E_kin = sum([system.E_kin for system in self.systems])
+        self.E_pot = sum([system.E_pot for system in self.systems])
+        self.E_tot = self.E_kin + self.E_pot
+        self.E_err = max([system.E_err for system in self.systems])
+
+
+
+    ##########################################################################
+    # BACKGROUND FUNCTIONS
+    ##########################################################################
+
+    # Groups the background models of the members by their class
+    # The models in each group are stacked into one model, which has an array of parameters with a value for each row
+    # Groups that cannot be stacked are evaluated separately for each member
+    def group_backgrounds (self):
+        groups = {}
+        for idx, system in enumerate(self.systems):
+            counts = {}
+            for cluster in system.clusters:
+                if not cluster.use_background: continue
+                key = type(cluster.model)
+                counts[key] = counts.get(key, 0) + 1
+                groups.setdefault((key, counts[key]), []).append((idx, cluster.model))
+
+        # Stack each group, or evaluate each of the models separately
+        self.backgrounds = []
+        for members in groups.values():
+            rows = np.concatenate([np.arange(self.n_bodies)[self.get_rows(idx)] for idx, model in members])
+            model = self.stack([model for idx, model in members])
+            if model is not None and self.check(model, members, rows):
+                self.backgrounds.append((model, rows))
+            else:
+                self.backgrounds.extend([(model, np.arange(self.n_bodies)[self.get_rows(idx)]) for idx, model in members])
+
+
+    # Returns a copy of the first model, with the numerical parameters that differ replaced by arrays for each row
+    # Returns None if the models differ in some other way
+    def stack (self, models: list):
+        model = copy.copy(models[0])
+        for name in set().union(*[vars(m).keys() for m in models]):
+            values = [getattr(m, name) for m in models]
+
+            # Skip the parameters that are the same for all of the models
+            if all([value is values[0] or (isinstance(value, (str, int, float, np.number)) and value == values[0]) for value in values]):
+                continue
+
+            # Stack the numerical parameters
+            if not all([isinstance(value, (int, float, np.number)) and not isinstance(value, bool) for value in values]):
+                return None
+            setattr(model, name, np.repeat(np.asarray(values, dtype=float64), self.n_member_bodies))
+        return model
+
+
+    # Checks that a stacked model gives the same accelerations and potentials as the models of each member
+    # Models with equations that do not accept arrays of parameters fail the check
+    def check (self, model, members: list, rows: np.ndarray) -> bool:
+        try:
+            a, pot = model.evaluate(self.particles.x[rows])
+        except (ValueError, TypeError):
+            return False
+        a_members, pot_members = zip(*[m.evaluate(self.particles.x[self.get_rows(idx)]) for idx, m in members])
+        return np.allclose(a, np.concatenate(a_members), rtol=1e-12, atol=0.0, equal_nan=True) and \
+            np.allclose(pot, np.concatenate(pot_members), rtol=1e-12, atol=0.0, equal_nan=True)
+
+
+    # Calculates the background accelerations and potentials of some target bodies, or all bodies
+    # Each body only feels the backgrounds of its own member
+    def get_background_forces (self, targets = None) -> tuple:
+        a = np.zeros((self.n_bodies, 3))
+        pot = np.zeros(self.n_bodies)
+
+        # Add in each group of backgrounds
+        for model, rows in self.backgrounds:
+            a_model, pot_model = model.evaluate(self.particles.x[rows])
+            a[rows] += a_model
+            pot[rows] += pot_model
+
+        # Return the accelerations and potentials of the targets
+        if targets is None: return a, pot
+        targets = self.solver.get_targets(self.particles, targets)
+        return a[targets], pot[targets]
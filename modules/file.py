@@ -1,4 +1,6 @@
 import os
+import hashlib
+import numpy as np
 from .body import Body
 from .time import Time
 from .model import Model
@@ -23,11 +25,23 @@ class File:
     def close (self):
         self.file.close()
 
+    # Returns the offset of the end of the file, after writing any buffered data
+    def offset (self) -> int:
+        self.file.flush()
+        return self.file.tell()
+
+    # Reopens the file to continue writing from some offset, removing anything written after it
+    def resume (self, offset: int):
+        self.file.close()
+        self.file = open(self.path, "r+")
+        self.file.seek(offset)
+        self.file.truncate()
+
     # Clears the output files
     @staticmethod
     def clear_files (dir: str = "output/"):
         if not os.path.exists(dir):
-            os.mkdir(dir)
+            os.makedirs(dir)
         for file in os.listdir(dir):
             os.remove(dir + file)
 
@@ -116,21 +130,44 @@ class SystemFile (File):
 # Class for writing to the initial data file
 class InitialFile:
 
-    # Static function to write to a file
+    # Static function to return the save line of some time, system and parameters
+    # The values are written exactly, so that runs with different parameters never have the same save line
+    @staticmethod
+    def signature (time: Time, system: System, **kwargs) -> str:
+        times = "Start: %r,  End: %r,  Delta: %r" % (float(time.start), float(time.end), float(time.delta))
+        models = [type(cluster.model).__name__ + InitialFile.describe(vars(cluster.model)) for cluster in system.clusters]
+        solver = "%s(softening = %r, kernel = %r)" % (type(system.solver).__name__, float(system.solver.softening), system.solver.kernel)
+        return "%s\n%s\n%s\n%s" % (times, models, solver, InitialFile.describe(kwargs))
+
+    # Static function to return the exact text of some parameter
+    # Functions are skipped and arrays are written as their shape and a hash of their values
+    @staticmethod
+    def describe (value) -> str:
+        if isinstance(value, dict):
+            return "{%s}" % ", ".join(["%r: %s" % (key, InitialFile.describe(value[key])) for key in sorted(value) if not callable(value[key])])
+        if isinstance(value, (list, tuple)):
+            return "[%s]" % ", ".join([InitialFile.describe(item) for item in value])
+        if isinstance(value, np.ndarray):
+            return "array%s %s" % (value.shape, hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+        if isinstance(value, (bool, int, float, str, np.number)) or value is None:
+            return repr(value.item() if isinstance(value, np.number) else value)
+        return type(value).__name__
+
+    # Static function to write to a file at some path
     @staticmethod
-    def write (time: Time, system: System, **kwargs):
+    def write (time: Time, system: System, path: str = "initial.dat", **kwargs):
 
         # Create save lin line
-        save = "%s\n%s\n%s" % (str(time), [str(cluster.model.__dict__) for cluster in system.clusters], str(kwargs))
+        save = InitialFile.signature(time, system, **kwargs)
 
         # Check to see if the file is the same
-        if os.path.isfile("initial.dat"):
-            with open("initial.dat", "r") as file:
+        if os.path.isfile(path):
+            with open(path, "r") as file:
                 if file.read() == save:
                     return False
 
         # Update the file
-        with open("initial.dat", "w") as file:
+        with open(path, "w") as file:
             file.write(save)
 
         # Returns a requirement to restart
@@ -1,10 +1,17 @@
+import os
 import sys
+import pickle
+import numpy as np
 from numpy import float64
 from .time import Time
 from .body import Body
 from .system import System
+from .ensemble import Ensemble
+from .model import KeplerModel
+from .constants import *
 from .color import Color
 from .file import *
+from . import kernels
 
 
 ##########################################################################
@@ -22,6 +29,24 @@ class Integrator:
     # The number of progress ticks
     ticks = 67
 
+    # The number of threads used by the solver, or None to use the solver's own setting
+    threads = None
+
+    # The directory that the output files are written to, which is cleared before the integration
+    directory = "output/"
+
+    # The file that the initial conditions are written to
+    initial_file = "initial.dat"
+
+    # The number of steps between checkpoints, or None to not write checkpoints
+    checkpoint_steps = None
+
+    # The file that the latest checkpoint is written to
+    checkpoint_file = "checkpoint.dat"
+
+    # Whether the integrator can integrate an ensemble, where each member must only feel its own bodies
+    ensembles = True
+
     # Initialises the integrator with some output
     def __init__ (self, name: str, **kwargs):
         self.name = name
@@ -35,30 +60,140 @@ class Integrator:
     ##########################################################################
 
     # Updates a body with new properties
-    # This function must be overriden by the integrator class
+    # This function must be overriden by the integrator class if not overriding the step
     def update (self, body: Body, body_idx: int, dt: float64):
         pass
 
 
+    # Advances all of the bodies in the system by one timestep
+    # By default, this updates each of the bodies in turn
+    # The bodies must also store their potentials in the particle arrays of the system
+    def step (self, dt: float64):
+        for idx, body in enumerate(self.system.bodies):
+            self.update(body, idx, dt)
+
+
+    # Prepares the integrator before the first step
+    def start (self, time: Time):
+        pass
+
+    # Outputs any statistics of the integrator after the integration
+    def report (self):
+        pass
+
+
+    # Updates the velocities of all bodies from their accelerations over some time
+    def kick (self, dt: float64):
+        particles = self.system.particles
+        kernels.kick(particles.v, particles.a, dt)
+
+    # Updates the positions of all bodies from their velocities over some time
+    def drift (self, dt: float64):
+        particles = self.system.particles
+        kernels.drift(particles.x, particles.v, dt)
+
+    # Calculates the accelerations and potentials of all bodies in a single batched evaluation
+    def accelerate (self):
+        particles = self.system.particles
+        particles.a[:], particles.PE[:] = self.system.compute_forces()
+
+
+
+    # Returns the parameters of the integrator, which are the attributes of its class that are not functions
+    # The settings of the output, progress and checkpoints do not change the integration, so they are not included
+    def get_parameters (self) -> dict:
+        settings = ["verbose", "ticks", "threads", "directory", "initial_file", "checkpoint_steps", "checkpoint_file"]
+        return {key: getattr(self, key) for key in dir(type(self)) \
+            if not key.startswith("_") and key not in settings and not callable(getattr(type(self), key))}
+
+    # Returns the attributes that the integrator has set during the integration
+    # These are the attributes that are not parameters of the integrator class
+    def get_state (self) -> dict:
+        return {key: value for key, value in vars(self).items() if not hasattr(type(self), key) and key not in ["name", "system", "output"]}
+
+    # Sets the attributes of the integrator from a checkpoint
+    def set_state (self, state: dict):
+        self.__dict__.update(state)
+
+
+    # Returns the objects of the system that store their initial energies
+    def get_energy_references (self) -> list:
+        return [self.system] + self.system.clusters + getattr(self.system, "systems", [])
+
+    # Writes a checkpoint of the integration, which replaces the previous checkpoint
+    # The checkpoint is written to a temporary file first, so the previous checkpoint is kept if this fails
+    # The signature of the initial conditions and the integrator class are stored, so that other runs are not resumed
+    def write_checkpoint (self, time: Time, next_write_time: float64, files: list, signature: str):
+        particles = self.system.particles
+        checkpoint = {
+            "signature":        signature,
+            "class":            type(self).__name__,
+            "time":             time.time,
+            "steps":            time.steps,
+            "next_write_time":  next_write_time,
+            "particles":        {key: getattr(particles, key).copy() for key in ["x", "v", "a", "PE", "E_init"]},
+            "E_init":           [obj.E_init for obj in self.get_energy_references()],
+            "offsets":          [file.offset() for file in files],
+            "integrator":       self.get_state(),
+        }
+        with open(self.checkpoint_file + ".tmp", "wb") as file:
+            pickle.dump(checkpoint, file)
+        os.replace(self.checkpoint_file + ".tmp", self.checkpoint_file)
+
+    # Reads the latest checkpoint, or returns None if there is no checkpoint
+    # The checkpoint must be from a run with the same initial conditions, integrator and number of bodies
+    def read_checkpoint (self, signature: str) -> dict:
+        if not os.path.isfile(self.checkpoint_file):
+            return None
+        with open(self.checkpoint_file, "rb") as file:
+            checkpoint = pickle.load(file)
+        if checkpoint.get("signature") != signature or checkpoint.get("class") != type(self).__name__ or \
+            len(checkpoint["particles"]["x"]) != self.system.particles.n:
+            raise Exception("Invalid checkpoint used.")
+        return checkpoint
+
+    # Sets the particle arrays and initial energies of the system from a checkpoint
+    def restore_particles (self, checkpoint: dict):
+        particles = self.system.particles
+        for key, value in checkpoint["particles"].items():
+            getattr(particles, key)[:] = value
+        for obj, E_init in zip(self.get_energy_references(), checkpoint["E_init"]):
+            obj.E_init = E_init
+
+
 
     # Executes the integration with a system
     # Takes in the model, time, list of bodies and the output file
-    def execute (self, system: System, time: Time, output: str = "output.dat", output_timestep: float = 1):
+    # The integration can be resumed from the latest checkpoint, which continues the output files
+    def execute (self, system: System, time: Time, output: str = "output.dat", output_timestep: float = 1, resume: bool = False):
 
         # Reset the time
         time.reset()
 
+        # Check that the integrator supports the system
+        if isinstance(system, Ensemble) and not self.ensembles:
+            raise Exception("Invalid integrator used, as the %s integrator is not supported for an Ensemble." % self.name)
+
         # Set the global variables
         self.system = system
         self.output = output
 
         # Call check to see if needing to update
-        if not InitialFile.write(time, system, output_timestep=output_timestep) and False:
+        signature = InitialFile.signature(time, system, output_timestep=output_timestep, integrator=self.get_parameters())
+        if not InitialFile.write(time, system, path=self.initial_file, output_timestep=output_timestep) and False:
             Color.print("\nInitial conditions unchanged.", Color.WARNING)
             return
 
-        # Clear the previous files
-        File.clear_files()
+        # Read the checkpoint to resume from, if there is one
+        checkpoint = self.read_checkpoint(signature) if resume else None
+        if checkpoint is not None:
+            self.restore_particles(checkpoint)
+            time.time = checkpoint["time"]
+            time.steps = checkpoint["steps"]
+
+        # Clear the previous files, unless the files are continued from the checkpoint
+        if checkpoint is None:
+            File.clear_files(self.directory)
 
         # Stores the output files for each body
         files = []
@@ -68,11 +203,12 @@ class Integrator:
 
             # Get the file name and create the header
             file_name = File.get_file_name(output, idx)
-            file = BodyFile(name = file_name)
-            file.header()
+            file = BodyFile(dir = self.directory, name = file_name, write = checkpoint is None)
+            if checkpoint is None:
+                file.header()
 
-            # Write the initial data to the file
-            file.write(time, body)
+                # Write the initial data to the file
+                file.write(time, body)
             
             # Add the file to the list
             files.append(file)
@@ -85,69 +221,96 @@ class Integrator:
 
             # Get the file name and create the header
             file_name = File.get_file_name("cluster", idx)
-            file = ClusterFile(name = file_name)
-            file.header()
+            file = ClusterFile(dir = self.directory, name = file_name, write = checkpoint is None)
+            if checkpoint is None:
+                file.header()
 
-            # Write the initial data to the file
-            file.write(time, cluster)
+                # Write the initial data to the file
+                file.write(time, cluster)
             
             # Add the file to the list
             cluster_files.append(file)
 
 
         # Creates system file to store system data
-        sys_file = SystemFile()
-        sys_file.header()
-        self.system.update()
-        sys_file.write(time, self.system)
+        sys_file = SystemFile(dir = self.directory, write = checkpoint is None)
+        if checkpoint is None:
+            sys_file.header()
+            self.system.update()
+            sys_file.write(time, self.system)
+
+        # Continue the files from the checkpoint, removing anything written after it
+        else:
+            for file, offset in zip(files + cluster_files + [sys_file], checkpoint["offsets"]):
+                file.resume(offset)
 
         # Print status
         Color.print("\nPerforming Integration...", Color.WARNING)
 
         # Get the next write time
-        next_write_time = output_timestep - time.delta
+        next_write_time = output_timestep - time.delta if checkpoint is None else checkpoint["next_write_time"]
 
-        # Loop while the time is less than maximum
-        while time.running:
+        # Start the solver, which persists for the whole integration
+        system.solver.start(system.particles, self.threads)
 
-            # Increment the time
-            time.increment()
+        # The solver is always stopped, even if the integration fails
+        try:
 
-            # Determine if can write to this timestep
-            can_write: bool = False
+            # Prepare the integrator, and set its state from the checkpoint
+            self.start(time)
+            if checkpoint is not None:
+                self.restore_particles(checkpoint)
+                self.set_state(checkpoint["integrator"])
 
-            # Calculates the next time and sets the can_write flag
-            if time.time >= next_write_time or time.steps == time.steps_max:
-                next_write_time += output_timestep
-                can_write = True
+            # Loop while the time is less than maximum
+            while time.running:
 
-            # Loop through all the bodies
-            for idx, body in enumerate(system.bodies):
+                # Increment the time
+                time.increment()
+
+                # Determine if can write to this timestep
+                can_write: bool = False
+
+                # Calculates the next time and sets the can_write flag
+                if time.time >= next_write_time or time.steps == time.steps_max:
+                    next_write_time += output_timestep
+                    can_write = True
 
                 # Run the integrator on the bodies
-                self.update(body, idx, time.delta)
+                self.step(time.delta)
 
-                # Write data to file if able to write
-                if can_write: files[idx].write(time, body)        
+                # Update the properties of the bodies and write data to file if able to write
+                if can_write:
+                    self.system.update_bodies()
+                    for idx, body in enumerate(system.bodies): files[idx].write(time, body)
                     
-            # Update the system and cluster data file
-            if can_write: 
-                self.system.update()
-                sys_file.write(time, self.system)     
-                for idx, cluster in enumerate(system.clusters): cluster_files[idx].write(time, cluster)   
-
-            # Output the progress and flush the buffer
-            if self.verbose:
-                print("\t%2.1f%%  |  %s%s%s" % ((time.progress * 100.0), Color.YELLOW_B, \
-                    ("=" * int(time.progress * self.ticks)), Color.END), end="\r")
-                sys.stdout.flush()
+                # Update the system and cluster data file
+                if can_write: 
+                    self.system.update()
+                    sys_file.write(time, self.system)     
+                    for idx, cluster in enumerate(system.clusters): cluster_files[idx].write(time, cluster)   
+
+                # Write a checkpoint after every few steps
+                if self.checkpoint_steps and time.steps % self.checkpoint_steps == 0:
+                    self.write_checkpoint(time, next_write_time, files + cluster_files + [sys_file], signature)
+
+                # Output the progress and flush the buffer
+                if self.verbose:
+                    print("\t%2.1f%%  |  %s%s%s" % ((time.progress * 100.0), Color.YELLOW_B, \
+                        ("=" * int(time.progress * self.ticks)), Color.END), end="\r")
+                    sys.stdout.flush()
+
+        finally:
+            system.solver.stop(system.particles)
 
         # Print status
         Color.print("\nIntegration Complete!", Color.SUCCESS)
         print("\tDuration: %8.4f s" % time.duration)
+        self.report()
                 
         # Safely close the files
         for file in files: file.close()
+        for file in cluster_files: file.close()
         sys_file.close()
 
 
@@ -164,22 +327,815 @@ class LeapFrogIntegrator (Integrator):
         super().__init__("Leap Frog", **kwargs)
 
 
-    # Takes in an Input position, Velocity, Accleration and Delta Time
-    def update(self, body: Body, body_idx: int, dt: float):
+    # Advances all of the bodies with a kick, drift and kick
+    # The accelerations of all bodies are calculated once per step
+    # The properties of the bodies are only updated when they are written
+    def step (self, dt: float):
+        self.kick(0.5 * dt)
+        self.drift(dt)
+        self.accelerate()
+        self.kick(0.5 * dt)
+
+
+
+##########################################################################
+# REGULARISED INTEGRATOR
+##########################################################################
+
+# Leap Frog integration class with algorithmic regularisation of close encounters
+# When the timestep is too long for the closest bodies with mass, the step uses the logarithmic Hamiltonian leap frog
+# The timesteps then shrink with the potential energy, and the orbits of close pairs are regular
+class RegularisedIntegrator (Integrator):
+
+    # The close pairs and the energy of the regularised steps include every body, so ensembles are not supported
+    ensembles = False
+
+    # The fraction of the dynamical time of the closest pair of bodies with mass above which the step is regularised
+    eta = 0.02
+
+    # The number of regularised steps over each system timestep, at the starting potential energy
+    substeps = 16
+
+    # The relative error in the time at the end of the regularised steps
+    tolerance = 1e-12
+
+    # The maximum number of times the last regularised step is repeated to end at the timestep
+    iterations = 8
+
+    # The number of bodies in each tile when searching for close bodies
+    tile_size = 256
+
+    # Initialise the integrator with some timestep
+    def __init__ (self, **kwargs):
+        super().__init__("Regularised Leap Frog", **kwargs)
+
+
+    # Resets the statistics
+    def start (self, time: Time):
+        self.steps = 0
+        self.regularised = 0
+        self.evaluations = 0
+
+    # Returns the shortest dynamical time of any two bodies with mass over some time, sqrt(r^3 / G(m1 + m2))
+    # The separation is the closest approach of the bodies moving in straight lines, so that fast encounters are not stepped over
+    def get_timescale (self, dt: float) -> float64:
+        particles = self.system.particles
+        x = particles.x[particles.sources]
+        v = particles.v[particles.sources]
+        mass = particles.mass[particles.sources]
+        timescale = np.inf
+        for lo in range(0, len(x), self.tile_size):
+            dx = x[lo:lo + self.tile_size, np.newaxis, :] - x[np.newaxis, lo + 1:, :]
+            dv = v[lo:lo + self.tile_size, np.newaxis, :] - v[np.newaxis, lo + 1:, :]
+
+            # Find the time of the closest approach within the step
+            v2 = np.einsum("ijk,ijk->ij", dv, dv)
+            t = np.clip(-np.einsum("ijk,ijk->ij", dx, dv) / np.where(v2 > 0, v2, 1.0), 0.0, dt)
+            dx += t[:, :, np.newaxis] * dv
+            r2 = np.einsum("ijk,ijk->ij", dx, dx)
+
+            # Ignore each pair counted twice and the bodies themselves
+            r2[np.tril_indices(r2.shape[0], -1, r2.shape[1])] = np.inf
+            t2 = r2 ** 1.5 / (G * (mass[lo:lo + self.tile_size, np.newaxis] + mass[np.newaxis, lo + 1:]))
+            if t2.size: timescale = min(timescale, np.sqrt(np.min(t2)))
+        return timescale
+
+    # Calculates the accelerations and potentials of all bodies
+    # Returns the potential energy between the bodies with mass, and the background accelerations
+    def forces (self) -> tuple:
+        particles = self.system.particles
+        a_bg, pot_bg = self.system.get_background_forces()
+        a, pot = self.system.solver.evaluate(particles)
+        particles.a[:] = a + a_bg
+        particles.PE[:] = np.divide(pot_bg + particles.mass * pot, particles.mass, out=np.zeros(particles.n), where=particles.mass > 0)
+        self.evaluations += 1
+        return -0.5 * np.sum(particles.mass * pot), a_bg
+
+    # Returns the kinetic energy of all bodies
+    def kinetic (self) -> float64:
+        particles = self.system.particles
+        return 0.5 * np.sum(particles.mass * np.einsum("ij,ij->i", particles.v, particles.v))
+
+
+    # Advances all of the bodies by one logarithmic Hamiltonian step, where the time only advances in the drifts
+    # Returns the time of the step, the new kinetic and binding energies, and the potential energy in the step
+    def advance (self, h: float, T: float64, B: float64) -> tuple:
+        particles = self.system.particles
 
-        # Set up the initial velocity
-        body.state.v += 0.5 * dt * body.state.a
+        # Drift over the first half of the step
+        dt_drift = 0.5 * h / (T + B)
+        self.drift(dt_drift)
+        dt = dt_drift
+
+        # Kick the velocities over the time given by the potential energy
+        U, a_bg = self.forces()
+        v = particles.v.copy()
+        self.kick(h / U)
+
+        # The background changes the energy of the bodies with mass
+        B -= h / U * np.sum(particles.mass * np.einsum("ij,ij->i", 0.5 * (v + particles.v), a_bg))
+
+        # Drift over the second half of the step
+        T = self.kinetic()
+        dt_drift = 0.5 * h / (T + B)
+        self.drift(dt_drift)
+        return dt + dt_drift, T, B, U
+
+
+    # Advances all of the bodies by one timestep, regularising the step if bodies are close
+    def step (self, dt: float):
+        particles = self.system.particles
+        self.steps += 1
+        t = 0.0
+
+        # Regularise the step if the timestep is too long for the closest bodies with mass
+        if dt > self.eta * self.get_timescale(dt):
+            self.regularised += 1
+            U, a_bg = self.forces()
+            T = self.kinetic()
+            B = U - T
+            h = dt * U / self.substeps
+
+            # Take regularised steps until the end of the timestep
+            while U > 0 and dt - t > self.tolerance * dt:
+                x, v = particles.x.copy(), particles.v.copy()
+                last = t + h / (T + B) >= dt
+                h_step = (dt - t) * (T + B) if last else h
+                dt_step, T_step, B_step, U = self.advance(h_step, T, B)
+
+                # The last step is repeated until it ends at the end of the timestep
+                iteration = 0
+                while (last or t + dt_step > dt) and abs(t + dt_step - dt) > self.tolerance * dt and iteration < self.iterations:
+                    last = True
+                    particles.x[:], particles.v[:] = x, v
+                    h_step *= (dt - t) / dt_step
+                    dt_step, T_step, B_step, U = self.advance(h_step, T, B)
+                    iteration += 1
+                t, T, B = t + dt_step, T_step, B_step
+
+        # Finish the timestep with a kick, drift and kick
+        self.kick(0.5 * (dt - t))
+        self.drift(dt - t)
+        self.accelerate()
+        self.evaluations += 1
+        self.kick(0.5 * (dt - t))
+
+
+    # Outputs the number of regularised steps
+    def report (self):
+        Color.print("\nRegularised Steps", Color.HEADER)
+        print("\tSteps: %d of %d regularised" % (self.regularised, self.steps))
+        print("\tForce Evaluations: %d" % self.evaluations)
+
+
+
+
+
+##########################################################################
+# COMPOSITION INTEGRATORS
+##########################################################################
+
+# Symplectic integration class built from a sequence of kicks and drifts
+# The accelerations are calculated after each drift, so each step uses one evaluation per drift
+class CompositionIntegrator (Integrator):
+
+    # The fractions of the timestep for each kick, which start and end the step
+    kicks = [0.5, 0.5]
+
+    # The fractions of the timestep for each drift, which are between the kicks
+    drifts = [1.0]
+
+    # Initialise the integrator with some name
+    def __init__ (self, name: str = "Composition", **kwargs):
+        super().__init__(name, **kwargs)
+
+    # Returns the kicks and drifts of a composition of leap frog steps with some weights
+    # The kicks at the ends of each pair of leap frog steps are combined
+    @staticmethod
+    def compose (weights: list) -> tuple:
+        kicks = [0.5 * weights[0]] + [0.5 * (weights[i] + weights[i + 1]) for i in range(len(weights) - 1)] + [0.5 * weights[-1]]
+        return kicks, list(weights)
+
+
+    # Advances all of the bodies with the kicks and drifts
+    def step (self, dt: float):
+        for kick, drift in zip(self.kicks, self.drifts):
+            if kick != 0.0: self.kick(kick * dt)
+            self.drift(drift * dt)
+            self.accelerate()
+        if self.kicks[-1] != 0.0: self.kick(self.kicks[-1] * dt)
+
+
+
+
+
+# Fourth order Yoshida integration class
+# Composes three leap frog steps, where the middle step goes backwards in time
+class Yoshida4Integrator (CompositionIntegrator):
+
+    # Initialise the integrator with the triple jump weights
+    def __init__ (self, **kwargs):
+        cbrt2 = 2.0 ** (1.0 / 3.0)
+        self.kicks, self.drifts = self.compose([1.0 / (2.0 - cbrt2), -cbrt2 / (2.0 - cbrt2), 1.0 / (2.0 - cbrt2)])
+        super().__init__("Yoshida 4th Order", **kwargs)
+
+
+
+# Sixth order Yoshida integration class
+# Composes seven leap frog steps with the weights of the first solution found by Yoshida (1990)
+class Yoshida6Integrator (CompositionIntegrator):
+
+    # Initialise the integrator with the seven weights
+    def __init__ (self, **kwargs):
+        w1, w2, w3 = -1.17767998417887, 0.235573213359357, 0.784513610477560
+        w0 = 1.0 - 2.0 * (w1 + w2 + w3)
+        self.kicks, self.drifts = self.compose([w3, w2, w1, w0, w1, w2, w3])
+        super().__init__("Yoshida 6th Order", **kwargs)
+
+
+
+# Fourth order Forest-Ruth integration class
+# Uses the original drift first form, which calculates the accelerations after each of its four drifts
+class ForestRuthIntegrator (CompositionIntegrator):
+
+    # Initialise the integrator with the Forest-Ruth coefficients
+    def __init__ (self, **kwargs):
+        theta = 1.0 / (2.0 - 2.0 ** (1.0 / 3.0))
+        self.kicks = [0.0, theta, 1.0 - 2.0 * theta, theta, 0.0]
+        self.drifts = [0.5 * theta, 0.5 * (1.0 - theta), 0.5 * (1.0 - theta), 0.5 * theta]
+        super().__init__("Forest-Ruth", **kwargs)
+
+
+
+
+
+##########################################################################
+# RUNGE-KUTTA INTEGRATOR
+##########################################################################
+
+# Adaptive Dormand-Prince 5(4) Runge-Kutta integration class
+# The positions and velocities of all bodies are integrated as a single state vector with their own timesteps
+# The state at the end of each system timestep is interpolated with the dense output of the last step
+# The system timestep therefore only sets when the state is sampled, and can be equal to the output timestep
+class RK45Integrator (Integrator):
+
+    # The relative tolerance of the error of each step
+    rtol = 1e-6
+
+    # The absolute tolerance of the error of each step
+    atol = 1e-9
+
+    # The safety factor of the next timestep
+    safety = 0.9
+
+    # The smallest and largest factors between timesteps
+    factor_min = 0.2
+    factor_max = 5.0
+
+    # The nodes, coefficients and weights of the Dormand-Prince method
+    C = [0.0, 1.0 / 5.0, 3.0 / 10.0, 4.0 / 5.0, 8.0 / 9.0, 1.0, 1.0]
+    A = [[],
+        [1.0 / 5.0],
+        [3.0 / 40.0, 9.0 / 40.0],
+        [44.0 / 45.0, -56.0 / 15.0, 32.0 / 9.0],
+        [19372.0 / 6561.0, -25360.0 / 2187.0, 64448.0 / 6561.0, -212.0 / 729.0],
+        [9017.0 / 3168.0, -355.0 / 33.0, 46732.0 / 5247.0, 49.0 / 176.0, -5103.0 / 18656.0],
+        [35.0 / 384.0, 0.0, 500.0 / 1113.0, 125.0 / 192.0, -2187.0 / 6784.0, 11.0 / 84.0]]
+
+    # The weights of the difference between the fifth and fourth order solutions
+    E = [71.0 / 57600.0, 0.0, -71.0 / 16695.0, 71.0 / 1920.0, -17253.0 / 339200.0, 22.0 / 525.0, -1.0 / 40.0]
+
+    # The weights of the dense output
+    D = [-12715105075.0 / 11282082432.0, 0.0, 87487479700.0 / 32700410799.0, -10690763975.0 / 1880347072.0, \
+        701980252875.0 / 199316789632.0, -1453857185.0 / 822651844.0, 69997945.0 / 29380423.0]
+
+    # Initialise the integrator with some timestep
+    def __init__ (self, **kwargs):
+        super().__init__("Dormand-Prince RK45", **kwargs)
+
+
+    # Returns the derivative of a state vector, which are the velocities and accelerations
+    def derivative (self, y: np.ndarray) -> np.ndarray:
+        particles = self.system.particles
+        particles.x[:] = y[:3 * particles.n].reshape(particles.n, 3)
+        self.evaluations += 1
+        return np.concatenate([y[3 * particles.n:], self.system.compute_forces()[0].ravel()])
+
+    # Returns the root mean square of the errors of a state vector over the tolerances
+    def norm (self, error: np.ndarray, y: np.ndarray, y_new: np.ndarray) -> float64:
+        scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+        return np.sqrt(np.mean((error / scale) ** 2)) if error.size else 0.0
+
+
+    # Creates the state vector and estimates the first timestep
+    def start (self, time: Time):
+        particles = self.system.particles
+        self.y = np.concatenate([particles.x.ravel(), particles.v.ravel()])
+        self.f = np.concatenate([particles.v.ravel(), particles.a.ravel()])
+        self.t = 0.0
+        self.t_end = 0.0
+
+        # Reset the statistics
+        self.accepted = 0
+        self.rejected = 0
+        self.evaluations = 0
+
+        # Estimate the first timestep from the change in the derivative over a small step
+        d0 = self.norm(self.y, self.y, self.y)
+        d1 = self.norm(self.f, self.y, self.y)
+        h0 = 0.01 * d0 / d1 if d0 > 1e-5 and d1 > 1e-5 else 1e-6
+        h0 = min(h0, time.delta)
+        d2 = self.norm(self.derivative(self.y + h0 * self.f) - self.f, self.y, self.y) / h0
+        h1 = (0.01 / max(d1, d2)) ** 0.2 if max(d1, d2) > 1e-15 else max(1e-6, 1e-3 * h0)
+        self.h = min(100.0 * h0, h1)
+
+
+    # Attempts a single step of the state vector, and returns whether the step was accepted
+    def advance (self) -> bool:
+        h, y = self.h, self.y
+
+        # Calculate the stages, where the first stage is the derivative at the end of the last step
+        k = [self.f]
+        for i in range(1, 7):
+            k.append(self.derivative(y + h * sum(coef * k[j] for j, coef in enumerate(self.A[i]) if coef != 0.0)))
+        y_new = y + h * sum(coef * k[j] for j, coef in enumerate(self.A[6]) if coef != 0.0)
+
+        # Calculate the error and the next timestep
+        err = self.norm(h * sum(coef * k[j] for j, coef in enumerate(self.E) if coef != 0.0), y, y_new)
+        factor = self.safety * err ** -0.2 if err > 0 else self.factor_max
+        if err > 1.0:
+            self.h *= max(self.factor_min, min(1.0, factor))
+            self.rejected += 1
+            return False
+        self.h *= max(self.factor_min, min(self.factor_max, factor))
+
+        # Store the dense output of the step
+        dy = y_new - y
+        self.dense = [y, dy, h * k[0] - dy, dy - h * k[6] - (h * k[0] - dy), \
+            h * sum(coef * k[j] for j, coef in enumerate(self.D) if coef != 0.0)]
+        self.t_step, self.h_step = self.t, h
+
+        # Accept the step
+        self.y, self.f = y_new, k[6]
+        self.t += h
+        self.accepted += 1
+        return True
+
+    # Interpolates the state vector at some time within the last step
+    def interpolate (self, t: float64) -> np.ndarray:
+        theta = (t - self.t_step) / self.h_step
+        r1, r2, r3, r4, r5 = self.dense
+        return r1 + theta * (r2 + (1.0 - theta) * (r3 + theta * (r4 + (1.0 - theta) * r5)))
+
+
+    # Advances the state vector past the end of the system timestep and interpolates the bodies
+    def step (self, dt: float):
+        particles = self.system.particles
+        self.t_end += dt
+        while self.t < self.t_end:
+            self.advance()
+
+        # Set the bodies from the interpolated state and calculate their accelerations
+        y = self.interpolate(self.t_end)
+        particles.x[:] = y[:3 * particles.n].reshape(particles.n, 3)
+        particles.v[:] = y[3 * particles.n:].reshape(particles.n, 3)
+        self.accelerate()
+        self.evaluations += 1
+
+
+    # Outputs the number of steps and evaluations
+    def report (self):
+        Color.print("\nRunge-Kutta Steps", Color.HEADER)
+        print("\tSteps: %d accepted, %d rejected" % (self.accepted, self.rejected))
+        print("\tForce Evaluations: %d" % self.evaluations)
+
+
+
+
+
+##########################################################################
+# BLOCK TIMESTEP INTEGRATOR
+##########################################################################
+
+# Leap Frog integration class with hierarchical block timesteps
+# Each body is placed on a rung, with a timestep that is the system timestep divided by a power of two
+# Only the active bodies at the end of their timestep are kicked and have their accelerations calculated
+class BlockIntegrator (Integrator):
+
+    # The deepest rung, which has a timestep of the system timestep over 2 ** max_rung
+    max_rung = 8
+
+    # The accuracy of the timesteps, as a fraction of the time for the acceleration to change
+    eta = 0.05
+
+    # The fraction of the median acceleration of the bodies that is added to the acceleration of each body in the timestep criterion
+    # Bodies whose forces cancel then keep a timestep set by the system, rather than one that shrinks to zero
+    floor = 0.1
+
+    # Initialise the integrator with some timestep
+    def __init__ (self, **kwargs):
+        super().__init__("Block Leap Frog", **kwargs)
+
+
+    # Estimates the starting jerks of all bodies from a small drift
+    def start (self, time: Time):
+        particles = self.system.particles
+        self.delta = time.delta
+
+        # Drift all bodies over the smallest timestep and calculate the change in acceleration
+        h = time.delta / 2 ** self.max_rung
+        x = particles.x.copy()
+        self.drift(h)
+        a = self.system.compute_forces()[0]
+        particles.x[:] = x
+        self.jerk = (a - particles.a) / h
+
+        # Reset the statistics
+        self.rung_steps = np.zeros(self.max_rung + 1, dtype=int)
+        self.evaluations = 0
+        self.evaluations_shared = 0
+        self.clipped = 0
+        self.rung_needed = 0
+
+
+    # Calculates the rungs of some bodies from their accelerations and jerks
+    # The timestep of a body is the time taken for its acceleration to change by a fraction of eta
+    # Bodies that need a rung deeper than the max rung are placed on the max rung, which warns the first time
+    def get_rungs (self, a: np.ndarray, jerk: np.ndarray, dt: float64) -> np.ndarray:
+        particles = self.system.particles
+        a_all = np.sqrt(np.einsum("ij,ij->i", particles.a, particles.a))
+        a_mag = np.sqrt(np.einsum("ij,ij->i", a, a)) + self.floor * (np.median(a_all) if a_all.size else 0.0)
+        jerk_mag = np.sqrt(np.einsum("ij,ij->i", jerk, jerk))
+        ratio = np.full(a_mag.shape, np.inf)
+        np.divide(jerk_mag * dt, self.eta * a_mag, out=ratio, where=a_mag > 0)
+        ratio[jerk_mag == 0] = 1.0
+        rungs = np.ceil(np.log2(np.maximum(ratio, 1.0)))
+
+        # Count the bodies that need smaller timesteps than the max rung
+        clipped = rungs[(rungs > self.max_rung) & (a_mag > 0)]
+        if clipped.size > 0:
+            if self.clipped == 0:
+                Color.print("\nWarning: The timestep criterion needs rung %d, but the max rung is %d. Increase max_rung or decrease the timestep." % \
+                    (clipped.max(), self.max_rung), Color.ERROR)
+            self.clipped += clipped.size
+            self.rung_needed = max(self.rung_needed, int(clipped.max()))
+        return np.clip(rungs, 0, self.max_rung).astype(int)
+
+
+    # Advances all of the bodies over the system timestep with their own timesteps
+    # The time is counted in ticks of the smallest timestep, and all bodies are synchronised at the end
+    def step (self, dt: float):
+        particles = self.system.particles
+        ticks_max = 2 ** self.max_rung
+        h = dt / ticks_max
+
+        # Place all bodies on their rungs and kick them over the first half of their timesteps
+        rungs = self.get_rungs(particles.a, self.jerk, dt)
+        ticks = 2 ** (self.max_rung - rungs)
+        a_start = particles.a.copy()
+        particles.v += 0.5 * (ticks * h)[:, np.newaxis] * particles.a
+        next_tick = ticks.copy()
+        finest = rungs.max()
+
+        # Drift to the end of the next timestep and calculate the forces of the active bodies
+        tick = 0
+        while tick < ticks_max:
+            self.drift((next_tick.min() - tick) * h)
+            tick = next_tick.min()
+            active = np.flatnonzero(next_tick == tick)
+            a, particles.PE[active] = self.system.compute_forces(active)
+            particles.a[active] = a
+
+            # Kick the active bodies over the second half of their timesteps and estimate their jerks
+            dt_active = (ticks[active] * h)[:, np.newaxis]
+            particles.v[active] += 0.5 * dt_active * a
+            self.jerk[active] = (a - a_start[active]) / dt_active
+            self.rung_steps += np.bincount(rungs[active], minlength=self.max_rung + 1)
+            self.evaluations += active.size
+            if tick == ticks_max: break
+
+            # Move the active bodies to new rungs, where larger timesteps must start on a multiple of the timestep
+            rungs[active] = self.get_rungs(a, self.jerk[active], dt)
+            ticks[active] = 2 ** (self.max_rung - rungs[active])
+            while np.any(tick % ticks[active] != 0):
+                unaligned = active[tick % ticks[active] != 0]
+                rungs[unaligned] += 1
+                ticks[unaligned] //= 2
+            finest = max(finest, rungs[active].max())
+
+            # Kick the active bodies over the first half of their new timesteps
+            a_start[active] = a
+            particles.v[active] += 0.5 * (ticks[active] * h)[:, np.newaxis] * a
+            next_tick[active] = tick + ticks[active]
+
+        # Count the force evaluations if all bodies used the smallest timestep of this step
+        self.evaluations_shared += particles.n * 2 ** finest
+
+
+    # Outputs the distribution of the rungs and the force evaluations saved
+    def report (self):
+        Color.print("\nBlock Timesteps", Color.HEADER)
+        print("\t    Rung\t      dt\t   Steps\tFraction")
+        total = max(self.rung_steps.sum(), 1)
+        for rung, steps in enumerate(self.rung_steps):
+            if steps == 0: continue
+            print("\t%8d\t%8.2e\t%8d\t%7.2f%%" % (rung, self.delta / 2 ** rung, steps, 100.0 * steps / total))
+        saved = 1.0 - self.evaluations / max(self.evaluations_shared, 1)
+        print("\tForce Evaluations: %d of %d with a shared timestep (%.1f%% saved)" % \
+            (self.evaluations, self.evaluations_shared, 100.0 * saved))
+        if self.clipped > 0:
+            Color.print("\tSteps Limited by the Max Rung: %d (Deepest Rung Needed: %d)" % (self.clipped, self.rung_needed), Color.ERROR)
+
+
+
+##########################################################################
+# HERMITE INTEGRATOR
+##########################################################################
+
+# Fourth order Hermite predictor-corrector integration class
+# The accelerations and jerks are calculated together, and the timestep is chosen from the Aarseth criterion
+# Each system timestep is split into as many steps as the criterion needs
+class HermiteIntegrator (Integrator):
+
+    # The jerks are only calculated by the direct solver of a system, so ensembles are not supported
+    ensembles = False
+
+    # The accuracy of the Aarseth timestep criterion
+    eta = 0.02
+
+    # The accuracy of the first timestep, which only uses the accelerations and jerks
+    eta_start = 0.01
+
+    # Initialise the integrator with some timestep
+    def __init__ (self, **kwargs):
+        super().__init__("Hermite", **kwargs)
+
+
+    # Calculates the starting jerks and the first timestep
+    def start (self, time: Time):
+        particles = self.system.particles
+        particles.a[:], self.jerk, particles.PE[:] = self.system.compute_jerks()
+        self.dt = self.get_timestep(self.eta_start * self.ratio(particles.a, self.jerk))
+
+        # Reset the statistics
+        self.steps = 0
+
+    # Returns the smallest ratio of the magnitudes of two arrays of vectors
+    # Vectors with a magnitude of zero are ignored
+    @staticmethod
+    def ratio (top: np.ndarray, bottom: np.ndarray) -> float64:
+        top = np.sqrt(np.einsum("ij,ij->i", top, top))
+        bottom = np.sqrt(np.einsum("ij,ij->i", bottom, bottom))
+        ratio = np.full(top.shape, np.inf)
+        np.divide(top, bottom, out=ratio, where=(bottom > 0) & (top > 0))
+        return np.min(ratio) if ratio.size else np.inf
+
+    # Returns a timestep, which is infinite if the bodies do not accelerate
+    @staticmethod
+    def get_timestep (dt: float64) -> float64:
+        return dt if np.isfinite(dt) and dt > 0 else np.inf
+
+
+    # Advances all of the bodies over the system timestep with as many Hermite steps as needed
+    def step (self, dt: float):
+        particles = self.system.particles
+        t = 0.0
+        while t < dt * (1.0 - 1e-12):
+            h = min(self.dt, dt - t)
+            x, v, a, jerk = particles.x.copy(), particles.v.copy(), particles.a.copy(), self.jerk
+
+            # Predict the positions and velocities from the accelerations and jerks
+            particles.x += h * v + (h ** 2 / 2.0) * a + (h ** 3 / 6.0) * jerk
+            particles.v += h * a + (h ** 2 / 2.0) * jerk
+
+            # Calculate the accelerations and jerks at the predicted positions and velocities
+            a_new, jerk_new, particles.PE[:] = self.system.compute_jerks()
+
+            # Correct the velocities and positions
+            particles.v[:] = v + (h / 2.0) * (a + a_new) + (h ** 2 / 12.0) * (jerk - jerk_new)
+            particles.x[:] = x + (h / 2.0) * (v + particles.v) + (h ** 2 / 12.0) * (a - a_new)
+            particles.a[:] = a_new
+            self.jerk = jerk_new
+
+            # Calculate the higher derivatives of the acceleration at the end of the step
+            a3 = (12.0 * (a - a_new) + 6.0 * h * (jerk + jerk_new)) / h ** 3
+            a2 = (-6.0 * (a - a_new) - h * (4.0 * jerk + 2.0 * jerk_new)) / h ** 2 + h * a3
+
+            # Choose the next timestep from the Aarseth criterion of every body
+            a_mag, jerk_mag, a2_mag, a3_mag = [np.sqrt(np.einsum("ij,ij->i", d, d)) for d in [a_new, jerk_new, a2, a3]]
+            top = a_mag * a2_mag + jerk_mag ** 2
+            bottom = jerk_mag * a3_mag + a2_mag ** 2
+            ratio = np.full(top.shape, np.inf)
+            np.divide(top, bottom, out=ratio, where=bottom > 0)
+            self.dt = self.get_timestep(self.eta * np.sqrt(np.min(ratio)) if ratio.size else np.inf)
+
+            t += h
+            self.steps += 1
+
+
+    # Outputs the number of Hermite steps
+    def report (self):
+        Color.print("\nHermite Steps", Color.HEADER)
+        print("\tSteps: %d" % self.steps)
+
+
+
+
+
+##########################################################################
+# WISDOM-HOLMAN INTEGRATOR
+##########################################################################
+
+# Wisdom-Holman mixed variable integration class for bodies orbiting a dominant central mass
+# The orbits about the central mass are advanced exactly by a Kepler drift, and all other forces are applied as kicks
+# The central mass is either the Kepler backgrounds at the origin, or the most massive body in democratic heliocentric coordinates
+# The timestep can therefore be a sizeable fraction of an orbit
+class WisdomHolmanIntegrator (Integrator):
+
+    # The central mass is found from every body and background, so ensembles are not supported
+    ensembles = False
+
+    # The index of the central body, which is the most massive body by default
+    # This is ignored if the system has a Kepler background
+    central: int = None
+
+    # The maximum number of iterations when solving the Kepler equation
+    iterations = 50
+
+    # The relative accuracy of the universal anomaly when solving the Kepler equation
+    tolerance = 1e-14
+
+    # Initialise the integrator with some timestep
+    def __init__ (self, **kwargs):
+        super().__init__("Wisdom-Holman", **kwargs)
+
+
+    # Finds the central mass that the bodies orbit
+    def start (self, time: Time):
+        particles = self.system.particles
+        self.mu = G * sum([cluster.model.M for cluster in self.system.clusters if cluster.use_background and isinstance(cluster.model, KeplerModel)])
+        self.central_idx = None
+
+        # Use the most massive body when there is no Kepler background
+        if self.mu == 0.0:
+            self.central_idx = int(np.argmax(particles.mass)) if self.central is None else self.central
+            if particles.n == 0 or particles.mass[self.central_idx] <= 0.0:
+                raise Exception("Invalid central body used.")
+
+            # The Kepler orbits are not softened, so the solver must not soften the forces of the central body
+            if self.system.solver.softening > 0:
+                raise Exception("Invalid solver softening used.")
+            self.mu = G * particles.mass[self.central_idx]
+            self.others = np.flatnonzero(np.arange(particles.n) != self.central_idx)
+
+    # Returns the accelerations (N, 3) of some positions (N, 3) relative to the central mass
+    def get_central_acceleration (self, x: np.ndarray) -> np.ndarray:
+        r = np.sqrt(np.einsum("ij,ij->i", x, x))
+        inv3 = np.zeros(len(x))
+        np.divide(1.0, r ** 3, out=inv3, where=r > 0)
+        return x * (-self.mu * inv3)[:, np.newaxis]
+
+
+    # Returns the Stumpff functions c0, c1, c2 and c3 of an array of arguments
+    # A series is used near zero, where the closed forms lose their accuracy
+    @staticmethod
+    def stumpff (z: np.ndarray) -> tuple:
+        c2 = np.empty(z.shape)
+        c3 = np.empty(z.shape)
+
+        # Use the series near zero
+        small = np.abs(z) < 0.1
+        zs = z[small]
+        c2[small] = 1.0 / 2.0 - zs / 24.0 + zs ** 2 / 720.0 - zs ** 3 / 40320.0 + zs ** 4 / 3628800.0
+        c3[small] = 1.0 / 6.0 - zs / 120.0 + zs ** 2 / 5040.0 - zs ** 3 / 362880.0 + zs ** 4 / 39916800.0
+
+        # Use the trigonometric functions for ellipses
+        ellipse = z >= 0.1
+        sz = np.sqrt(z[ellipse])
+        c2[ellipse] = (1.0 - np.cos(sz)) / sz ** 2
+        c3[ellipse] = (sz - np.sin(sz)) / sz ** 3
+
+        # Use the hyperbolic functions for hyperbolas
+        hyperbola = z <= -0.1
+        sz = np.sqrt(-z[hyperbola])
+        c2[hyperbola] = (np.cosh(sz) - 1.0) / sz ** 2
+        c3[hyperbola] = (np.sinh(sz) - sz) / sz ** 3
+
+        # The first functions follow from the recurrence relations
+        return 1.0 - z * c2, 1.0 - z * c3, c2, c3
+
+    # Advances positions (N, 3) and velocities (N, 3) along their Kepler orbits about some mass over some time
+    # The universal Kepler equation is solved for all orbits at once with Laguerre-Conway iterations
+    def kepler (self, x: np.ndarray, v: np.ndarray, mu: float64, dt: float) -> tuple:
+        r0 = np.sqrt(np.einsum("ij,ij->i", x, x))
+        orbit = r0 > 0
+        r0 = np.where(orbit, r0, 1.0)
+        eta = np.einsum("ij,ij->i", x, v)
+        beta = 2.0 * mu / r0 - np.einsum("ij,ij->i", v, v)
+        zeta = mu - beta * r0
+
+        # Bound orbits only need to be advanced by the time remaining after whole periods
+        t = np.full(len(x), float(dt))
+        bound = beta > 0
+        t[bound] = np.fmod(t[bound], 2.0 * PI * mu / beta[bound] ** 1.5)
+
+        # Start from the anomaly of a straight line, limited by the anomaly over a period of bound orbits
+        # Unbound orbits are limited by the anomaly of the asymptotes, so the hyperbolic functions do not overflow
+        s = t / r0
+        limit = np.empty(len(x))
+        limit[bound] = 2.0 * PI / np.sqrt(beta[bound])
+        k = np.sqrt(-beta[~bound])
+        k_safe = np.where(k > 0, k, 1.0)
+        scale = np.maximum(r0[~bound] + np.sign(t[~bound]) * eta[~bound] / k_safe + mu / k_safe ** 2, r0[~bound])
+        asymptote = np.log1p(2.0 * k * np.abs(t[~bound]) / scale) / k_safe
+        parabola = np.cbrt(6.0 * np.abs(t[~bound]) / mu)
+        limit[~bound] = np.where(k * asymptote >= 1.0, np.minimum(asymptote, parabola), parabola)
+        s = np.clip(s, -limit, limit)
+
+        # Solve for the universal anomaly of every orbit, only iterating the orbits that have not converged
+        active = np.arange(len(x))
+        for iteration in range(self.iterations):
+            sa = s[active]
+            c0, c1, c2, c3 = self.stumpff(beta[active] * sa ** 2)
+            f = r0[active] * sa * c1 + eta[active] * sa ** 2 * c2 + mu * sa ** 3 * c3 - t[active]
+            df = r0[active] * c0 + eta[active] * sa * c1 + mu * sa ** 2 * c2
+            ddf = eta[active] * c0 + zeta[active] * sa * c1
+            ds = -5.0 * f / (df + np.sign(df) * np.sqrt(np.abs(16.0 * df ** 2 - 20.0 * f * ddf)))
+            s[active] = sa + ds
+            active = active[np.abs(ds) > self.tolerance * np.abs(sa + ds)]
+            if active.size == 0: break
+
+        # Calculate the new positions and velocities from the Lagrange coefficients
+        c0, c1, c2, c3 = self.stumpff(beta * s ** 2)
+        r = r0 * c0 + eta * s * c1 + mu * s ** 2 * c2
+        f = 1.0 - mu * s ** 2 * c2 / r0
+        g = t - mu * s ** 3 * c3
+        df = -mu * s * c1 / (r0 * r)
+        dg = 1.0 - mu * s ** 2 * c2 / r
+        x_new = np.where(orbit[:, np.newaxis], f[:, np.newaxis] * x + g[:, np.newaxis] * v, x)
+        v_new = np.where(orbit[:, np.newaxis], df[:, np.newaxis] * x + dg[:, np.newaxis] * v, v)
+        return x_new, v_new
+
+
+    # Returns the heliocentric positions and barycentric velocities of the orbiting bodies
+    # The positions and velocities of the centre of mass are also returned
+    def split (self) -> tuple:
+        particles = self.system.particles
+        if self.central_idx is None:
+            return particles.x.copy(), particles.v.copy(), None, None
+
+        # Find the centre of mass and the coordinates relative to the central body
+        mass = particles.mass
+        X = mass @ particles.x / np.sum(mass)
+        V = mass @ particles.v / np.sum(mass)
+        return particles.x[self.others] - particles.x[self.central_idx], particles.v[self.others] - V, X, V
+
+    # Sets the positions and velocities of all bodies from the heliocentric coordinates
+    def join (self, Q: np.ndarray, u: np.ndarray, X: np.ndarray, V: np.ndarray):
+        particles = self.system.particles
+        if self.central_idx is None:
+            particles.x[:], particles.v[:] = Q, u
+            return
+
+        # Place the central body so that the centre of mass is unchanged
+        mass = particles.mass[self.others]
+        particles.x[self.central_idx] = X - mass @ Q / np.sum(particles.mass)
+        particles.x[self.others] = Q + particles.x[self.central_idx]
+        particles.v[self.others] = u + V
+        particles.v[self.central_idx] = V - mass @ u / particles.mass[self.central_idx]
+
+    # Kicks the bodies by the accelerations that are not from the central mass over some time
+    # The centre of mass is kicked by the mean acceleration, which is only due to the backgrounds
+    def perturb (self, Q: np.ndarray, u: np.ndarray, V: np.ndarray, dt: float):
+        particles = self.system.particles
+        if self.central_idx is None:
+            u += dt * (particles.a - self.get_central_acceleration(Q))
+            return
 
-        # Calculate the new parameters
-        body.state.x += dt * body.state.v
-        body.state.a = self.system.get_acceleration(body_idx)
-        body.state.v += 0.5 * dt * body.state.a
+        # Kick the bodies relative to the centre of mass
+        A = particles.mass @ particles.a / np.sum(particles.mass)
+        u += dt * (particles.a[self.others] - self.get_central_acceleration(Q) - A)
+        V += dt * A
 
-        # Update the potential
-        body.PE = self.system.get_potential(body_idx)
+    # Moves the bodies by the motion of the central body relative to the centre of mass over some time
+    def jump (self, Q: np.ndarray, u: np.ndarray, dt: float):
+        if self.central_idx is None: return
+        particles = self.system.particles
+        Q += dt * (particles.mass[self.others] @ u) / particles.mass[self.central_idx]
 
-        # Update the body
-        body.update()
-        
 
+    # Advances all of the bodies by one timestep with a kick, a Kepler drift and a kick
+    def step (self, dt: float):
+        Q, u, X, V = self.split()
+        self.perturb(Q, u, V, 0.5 * dt)
+        self.jump(Q, u, 0.5 * dt)
+        Q, u = self.kepler(Q, u, self.mu, dt)
+        self.jump(Q, u, 0.5 * dt)
+        if X is not None: X += dt * V
+        self.join(Q, u, X, V)
 
+        # Calculate the accelerations at the new positions
+        self.accelerate()
+        Q, u, X, V = self.split()
+        self.perturb(Q, u, V, 0.5 * dt)
+        self.join(Q, u, X, V)
@@ -0,0 +1,105 @@
+import numpy as np
+from .constants import *
+
+# Numba is optional, so the NumPy kernels are used if it is not installed
+try:
+    from numba import njit, prange
+    NUMBA = True
+except ImportError:
+    NUMBA = False
+
+
+
+##########################################################################
+# COMPILED KERNELS
+##########################################################################
+
+# The kernels are compiled on the first call and cached on disk for later runs
+# The loops over the targets are split between the cores with prange
+if NUMBA:
+
+    # Calculates the softened inverse distance and inverse cubed distance from a squared distance
+    # The plummer softening is added to the squared distance, and the spline is used within its length
+    @njit(cache=True)
+    def soften (r2: float, plummer2: float, spline: float) -> tuple:
+        if r2 <= 0.0:
+            return 0.0, 0.0
+        if r2 >= spline * spline:
+            inv = 1.0 / np.sqrt(r2 + plummer2)
+            return inv, inv * inv * inv
+
+        # Use the inner or outer part of the cubic spline
+        u = np.sqrt(r2) / spline
+        if u < 0.5:
+            inv = 14.0 / 5.0 - 16.0 / 3.0 * u ** 2 + 48.0 / 5.0 * u ** 4 - 32.0 / 5.0 * u ** 5
+            inv3 = 32.0 / 3.0 - 192.0 / 5.0 * u ** 2 + 32.0 * u ** 3
+        else:
+            inv = -1.0 / (15.0 * u) + 16.0 / 5.0 - 32.0 / 3.0 * u ** 2 + 16.0 * u ** 3 - 48.0 / 5.0 * u ** 4 + 32.0 / 15.0 * u ** 5
+            inv3 = 64.0 / 3.0 - 48.0 * u + 192.0 / 5.0 * u ** 2 - 32.0 / 3.0 * u ** 3 - 1.0 / (15.0 * u ** 3)
+        return inv / spline, inv3 / spline ** 3
+
+    # Calculates the accelerations (T, 3) and potentials (T) of some targets due to some sources
+    # Sources at the same position as the target are ignored
+    @njit(parallel=True, cache=True)
+    def gravity (x_t: np.ndarray, x_s: np.ndarray, mass: np.ndarray, plummer2: float, spline: float) -> tuple:
+        a = np.zeros((x_t.shape[0], 3))
+        pot = np.zeros(x_t.shape[0])
+        for i in prange(x_t.shape[0]):
+            ax = 0.0
+            ay = 0.0
+            az = 0.0
+            phi = 0.0
+            for j in range(x_s.shape[0]):
+                dx = x_t[i, 0] - x_s[j, 0]
+                dy = x_t[i, 1] - x_s[j, 1]
+                dz = x_t[i, 2] - x_s[j, 2]
+                inv, inv3 = soften(dx * dx + dy * dy + dz * dz, plummer2, spline)
+                gm = G * mass[j]
+                phi -= gm * inv
+                gm *= inv3
+                ax -= gm * dx
+                ay -= gm * dy
+                az -= gm * dz
+            a[i, 0] = ax
+            a[i, 1] = ay
+            a[i, 2] = az
+            pot[i] = phi
+        return a, pot
+
+    # Updates the velocities from the accelerations over some time
+    @njit(parallel=True, cache=True)
+    def parallel_kick (v: np.ndarray, a: np.ndarray, dt: float):
+        for i in prange(v.shape[0]):
+            for k in range(3):
+                v[i, k] += dt * a[i, k]
+
+    # Updates the positions from the velocities over some time
+    @njit(parallel=True, cache=True)
+    def parallel_drift (x: np.ndarray, v: np.ndarray, dt: float):
+        for i in prange(x.shape[0]):
+            for k in range(3):
+                x[i, k] += dt * v[i, k]
+
+
+
+##########################################################################
+# NUMPY KERNELS
+##########################################################################
+
+# The smallest number of particles that are kicked and drifted with the compiled kernels
+# Smaller arrays are faster with NumPy, which also avoids starting the thread pool of the kernels
+PARALLEL_SIZE = 65536
+
+# Updates the velocities from the accelerations over some time
+def kick (v: np.ndarray, a: np.ndarray, dt: float):
+    if NUMBA and len(v) >= PARALLEL_SIZE:
+        parallel_kick(v, a, dt)
+    else:
+        v += dt * a
+
+# Updates the positions from the velocities over some time
+def drift (x: np.ndarray, v: np.ndarray, dt: float):
+    if NUMBA and len(x) >= PARALLEL_SIZE:
+        parallel_drift(x, v, dt)
+    else:
+        x += dt * v
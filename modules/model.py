@@ -27,13 +27,41 @@ class Model:
     def radius (self, position: Vector) -> np.float64:
         return position.magnitude
 
+    # Calculates the radii (N) of an array of positions (N, 3)
+    def radii (self, x: np.ndarray) -> np.ndarray:
+        return np.sqrt(np.einsum("ij,ij->i", x, x))
+
     # Calculates the potential of the system at some position
-    def potential (self, position: Vector) -> np.float64:
-        return 0.0
+    # An array of positions (N, 3) returns an array of potentials (N)
+    def potential (self, position):
+        if isinstance(position, Vector):
+            return self.evaluate(np.array([position.array]))[1][0]
+        return self.evaluate(np.asarray(position, dtype=np.float64))[1]
 
     # Calculates the acceleration of a particle at some position
-    def acceleration (self, position: Vector) -> Vector:
-        return Vector(0, 0, 0)
+    # An array of positions (N, 3) returns an array of accelerations (N, 3)
+    def acceleration (self, position):
+        if isinstance(position, Vector):
+            return Vector(*self.evaluate(np.array([position.array]))[0][0].tolist())
+        return self.evaluate(np.asarray(position, dtype=np.float64))[0]
+
+    # Calculates the accelerations (N, 3) and potentials (N) at an array of positions (N, 3)
+    # Both are calculated in a single pass over the positions
+    # This function must be overriden by the model class
+    def evaluate (self, x: np.ndarray) -> tuple:
+        return np.zeros(x.shape), np.zeros(len(x))
+
+    # Calculates the jerks (N, 3) of bodies moving with some velocities (N, 3) at some positions (N, 3)
+    # By default, the accelerations are differenced along the paths of the bodies
+    def jerk (self, x: np.ndarray, v: np.ndarray) -> np.ndarray:
+        speed = np.sqrt(np.einsum("ij,ij->i", v, v))
+        moving = speed > 0
+        dt = np.ones(len(x))
+        dt[moving] = 1e-5 * np.maximum(self.radii(x[moving]), 1e-10) / speed[moving]
+        dx = v * dt[:, np.newaxis]
+        jerk = (self.evaluate(x + dx)[0] - self.evaluate(x - dx)[0]) / (2.0 * dt[:, np.newaxis])
+        jerk[~moving] = 0.0
+        return jerk
 
 
     ##########################################################################
@@ -83,23 +111,25 @@ class KeplerModel (Model):
     def __init__ (self, **kwargs):
         super().__init__("kepler", **kwargs)
 
-    # Calculates the potential of the system at some position
-    def potential (self, position: Vector) -> np.float64:
-        return -1.0 / self.radius(position)
+    # Calculates the accelerations and potentials at an array of positions
+    def evaluate (self, x: np.ndarray) -> tuple:
 
-    # Calculates the acceleration of a particle at some position
-    def acceleration (self, position: Vector) -> Vector:
+        # Compute the radius values
+        r = self.radii(x)
 
-        # Compute the position value
-        r3 = position.magnitude ** 3
+        # Calculate the acceleration and potential
+        # The mass can also be an array with a value for each position
+        a = x * (-1.0 * self.M * G / r ** 3)[:, np.newaxis]
+        pot = -1.0 / r
 
-        a = Vector()
+        # Return the acceleration and potential
+        return a, pot
 
-        # Calculate the acceleration
-        a = position * (-1.0 / r3) * self.M * G
-
-        # Return the acceleration
-        return a
+    # Calculates the jerks of bodies moving with some velocities at some positions
+    def jerk (self, x: np.ndarray, v: np.ndarray) -> np.ndarray:
+        r = self.radii(x)
+        rv = np.einsum("ij,ij->i", x, v)
+        return (-1.0 * self.M * G) * (v / (r ** 3)[:, np.newaxis] - x * (3.0 * rv / r ** 5)[:, np.newaxis])
 
 
     ##########################################################################
@@ -138,19 +168,16 @@ class IsochroneModel (Model):
     def __init__ (self, **kwargs):
         super().__init__("isochrone", **kwargs)
 
-    # Calculates the potential of the system at some position
-    def potential (self, position: Vector) -> np.float64:
-        return (-1. * G * self.M) / (self.b + np.sqrt(self.b ** 2 + self.radius(position) ** 2))
-
-    # Calculates the acceleration of a particle at some position
-    def acceleration (self, position: Vector) -> Vector:
+    # Calculates the accelerations and potentials at an array of positions
+    def evaluate (self, x: np.ndarray) -> tuple:
 
-        r = self.radius(position)
+        r = self.radii(x)
         c = np.sqrt(r ** 2 + self.b ** 2)
-        a = position * ((-1. * G * self.M) / (c * ((self.b + c) ** 2)))
+        a = x * ((-1. * G * self.M) / (c * ((self.b + c) ** 2)))[:, np.newaxis]
+        pot = (-1. * G * self.M) / (self.b + c)
 
-        # Return the acceleration
-        return a
+        # Return the acceleration and potential
+        return a, pot
 
     # Calculate the escape velocity
     def escape_velocity (self, x: Vector) -> np.float64:
@@ -195,6 +222,9 @@ class OscillatorModel (Model):
     # The orbit potential
     Omega   = None
 
+    # The angular frequency, which is calculated once from the density if Omega is not set
+    omega   = None
+
 
     ##########################################################################
     # Model Equations
@@ -202,20 +232,18 @@ class OscillatorModel (Model):
     # Initialise the model
     def __init__ (self, **kwargs):
         super().__init__("oscillator", **kwargs)
+        self.omega = self.get_omega()
 
-    # Calculates the potential of the system at some position
-    def potential (self, position: Vector) -> np.float64:
-        return -0.5 * (self.radius(position) ** 2) + (self.omega ** 2)
+    # Calculates the accelerations and potentials at an array of positions
+    def evaluate (self, x: np.ndarray) -> tuple:
+        a = x * (-1. * (self.omega ** 2))
+        pot = -0.5 * (self.radii(x) ** 2) + (self.omega ** 2)
 
-    # Calculates the acceleration of a particle at some position
-    def acceleration (self, position: Vector) -> Vector:
-
-        # Return the acceleration
-        return position * -1. * (self.omega ** 2)
+        # Return the acceleration and potential
+        return a, pot
 
     # Calculates omega
-    @property
-    def omega (self) -> np.float64:
+    def get_omega (self) -> np.float64:
         if self.Omega == None:
             return np.sqrt(4.0 * PI * G * self.rho / 3.0)
         return self.Omega
@@ -262,18 +290,19 @@ class LogarithmicModel (Model):
     def __init__ (self, **kwargs):
         super().__init__("logarithmic", **kwargs)
 
-    # Calculates the potential of the system at some position
-    def potential (self, position: Vector) -> np.float64:
-        return 0.5 * (self.v0 ** 2) * np.log(self.psi(position))
-
-    # Calculates the acceleration of a particle at some position
-    def acceleration (self, position: Vector) -> Vector:
+    # Calculates the accelerations and potentials at an array of positions
+    # The value of psi is shared by the accelerations and potentials
+    def evaluate (self, x: np.ndarray) -> tuple:
+        psi = (x[:, 0] ** 2) + (x[:, 1] ** 2) + (self.Rc ** 2) + ((x[:, 2] ** 2) / (self.q ** 2))
 
         # Calculate the factor in front of the vector
-        fac = -1.0 * (self.v0 ** 2) / self.psi(position)
+        fac = -1.0 * (self.v0 ** 2) / psi
+        a = x * fac[:, np.newaxis]
+        a[:, 2] /= self.q ** 2
+        pot = 0.5 * (self.v0 ** 2) * np.log(psi)
 
-        # Return the acceleration factor
-        return Vector(position.x, position.y, position.z / (self.q ** 2)) * fac
+        # Return the acceleration and potential
+        return a, pot
 
     # Calculates the planar radius component
     def radius_plane (self, position: Vector) -> np.float64:
@@ -302,3 +331,116 @@ class LogarithmicModel (Model):
             return v
 
     ##########################################################################
+
+
+
+
+
+# Tabulated spherical mathematical model
+# Calculates the potential and acceleration from a density or enclosed mass profile
+# The profile is tabulated once on a log radial grid and interpolated, so it can be expensive to evaluate
+class TabulatedModel (Model):
+
+    # The density at some radius, used if the enclosed mass is not given
+    density         = None
+
+    # The mass enclosed within some radius
+    enclosed_mass   = None
+
+    # The smallest radius of the grid, within which the density is assumed to be uniform
+    r_min           = 1e-3
+
+    # The largest radius of the grid, outside of which all the mass is assumed to be enclosed
+    r_max           = 1e3
+
+    # The number of radii in the grid
+    n_grid          = 1000
+
+
+    ##########################################################################
+    # Model Equations
+
+    # Initialise the model and tabulate the profile
+    # The mass of the model is set by the profile, so M is not used
+    def __init__ (self, **kwargs):
+        super().__init__("tabulated", **kwargs)
+        self.tabulate()
+
+    # Tabulates the enclosed masses and potentials on the log radial grid
+    def tabulate (self):
+        if self.enclosed_mass is None and self.density is None:
+            raise Exception("Invalid profile used.")
+
+        # Create the grid, which is evenly spaced in the log of the radius
+        self.log_min = np.log(self.r_min)
+        self.log_step = (np.log(self.r_max) - self.log_min) / (self.n_grid - 1)
+        log_r = self.log_min + self.log_step * np.arange(self.n_grid)
+        r = np.exp(log_r)
+
+        # Calculate the enclosed masses, integrating the density outwards
+        if self.enclosed_mass is not None:
+            mass = np.vectorize(self.enclosed_mass, otypes=[np.float64])(r)
+        else:
+            shell = 4.0 * PI * r ** 3 * np.vectorize(self.density, otypes=[np.float64])(r)
+
+            # The mass within the grid follows the power law of the density at the smallest radii
+            slope = np.log(shell[1] / shell[0]) / self.log_step if shell[0] > 0 and shell[1] > 0 else 3.0
+            core = shell[0] / max(slope, 0.1)
+            mass = core + np.concatenate([[0.0], np.cumsum(0.5 * (shell[1:] + shell[:-1]) * self.log_step)])
+
+        # Calculate the potentials, integrating the acceleration inwards from the point mass outside the grid
+        g = G * mass / r
+        pot = -1.0 * G * mass[-1] / r[-1] - np.concatenate([np.cumsum((0.5 * (g[1:] + g[:-1]) * self.log_step)[::-1])[::-1], [0.0]])
+
+        # Store the tables
+        self.mass_table = mass
+        self.pot_table = pot
+
+    # Interpolates a table at some radii, which must be inside the grid
+    def interpolate (self, table: np.ndarray, r: np.ndarray) -> np.ndarray:
+        u = (np.log(r) - self.log_min) / self.log_step
+        i = np.clip(u.astype(int), 0, self.n_grid - 2)
+        w = u - i
+        return table[i] + w * (table[i + 1] - table[i])
+
+    # Calculates the enclosed masses (N) at some radii (N)
+    def enclosed (self, r: np.ndarray) -> np.ndarray:
+        r_grid = np.clip(r, self.r_min, self.r_max)
+        mass = self.interpolate(self.mass_table, r_grid)
+        return np.where(r < self.r_min, self.mass_table[0] * (r / self.r_min) ** 3, mass)
+
+    # Calculates the accelerations and potentials at an array of positions
+    def evaluate (self, x: np.ndarray) -> tuple:
+        r = self.radii(x)
+        r_grid = np.clip(r, self.r_min, self.r_max)
+
+        # Inside the grid, the mass is uniform and the acceleration is linear with radius
+        r_safe = np.maximum(r, self.r_min)
+        a_fac = -1.0 * G * self.enclosed(r_safe) / r_safe ** 3
+        a_fac[r < self.r_min] = -1.0 * G * self.mass_table[0] / self.r_min ** 3
+
+        # Interpolate the potential, which is a point mass outside the grid
+        pot = self.interpolate(self.pot_table, r_grid)
+        pot = np.where(r < self.r_min, pot - 0.5 * G * self.mass_table[0] / self.r_min ** 3 * (self.r_min ** 2 - r ** 2), pot)
+        pot = np.where(r > self.r_max, -1.0 * G * self.mass_table[-1] / r_safe, pot)
+
+        # Return the acceleration and potential
+        return x * a_fac[:, np.newaxis], pot
+
+
+    ##########################################################################
+    # Initial State and equations
+    
+    # Calculates the starting position at some radius
+    def initial_position (self, radius: np.float64) -> Vector:
+        return Vector(radius, 0, 0)
+
+    # Calculates the starting velocity from the circular velocity
+    def initial_velocity (self, position: Vector) -> np.float64:
+        r = np.array([position.mag])
+        v = np.sqrt(G * self.enclosed(r)[0] / r[0])
+        if self.v_mul != None:
+            return v * self.v_mul
+        return v
+
+    ##########################################################################
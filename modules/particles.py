@@ -0,0 +1,128 @@
+import numpy as np
+from numpy import float64
+from .vector import Vector
+from .state import State
+
+# Stores the properties of every particle in the system as contiguous arrays
+# Each body in the system is a view onto one row of these arrays
+class Particles:
+
+    ##########################################################################
+    # PARAMETERS
+    ##########################################################################
+
+    # The number of particles
+    n: int = 0
+
+    # The positions of the particles (N, 3)
+    x: np.ndarray = np.zeros((0, 3))
+
+    # The velocities of the particles (N, 3)
+    v: np.ndarray = np.zeros((0, 3))
+
+    # The accelerations of the particles (N, 3)
+    a: np.ndarray = np.zeros((0, 3))
+
+    # The masses of the particles (N)
+    mass: np.ndarray = np.zeros(0)
+
+    # The potentials of the particles per unit mass (N)
+    PE: np.ndarray = np.zeros(0)
+
+    # The initial energies of the particles (N)
+    E_init: np.ndarray = np.zeros(0)
+
+    # Whether each of the particles acts as a source of gravity (N)
+    has_mass: np.ndarray = np.zeros(0, dtype=bool)
+
+    # The indices of the particles with mass, which act as sources of gravity
+    sources: np.ndarray = np.zeros(0, dtype=int)
+
+    # The indices of the massless particles, which only feel the sources
+    tracers: np.ndarray = np.zeros(0, dtype=int)
+
+
+    ##########################################################################
+    # PARTICLE FUNCTIONS
+    ##########################################################################
+
+    # Creates the arrays from a list of bodies and binds the bodies to the arrays
+    def __init__ (self, bodies: list):
+        self.n = len(bodies)
+
+        # Copy the current states of the bodies into the arrays
+        self.x = np.array([body.state.x.array for body in bodies], dtype=float64).reshape(self.n, 3)
+        self.v = np.array([body.state.v.array for body in bodies], dtype=float64).reshape(self.n, 3)
+        self.a = np.array([body.state.a.array for body in bodies], dtype=float64).reshape(self.n, 3)
+        self.mass = np.array([body.mass for body in bodies], dtype=float64)
+        self.PE = np.array([body.PE for body in bodies], dtype=float64)
+        self.E_init = np.zeros(self.n)
+        self.has_mass = np.array([body.has_mass for body in bodies], dtype=bool)
+        self.update_sources()
+
+        # Replace the body states with views onto the arrays
+        for idx, body in enumerate(bodies):
+            body.bind(self, idx)
+
+    # Creates the particles from existing arrays, without any bodies
+    @staticmethod
+    def from_arrays (x: np.ndarray, mass: np.ndarray, has_mass: np.ndarray, v: np.ndarray = None, a: np.ndarray = None):
+        particles = Particles([])
+        particles.n = len(x)
+        particles.x = x
+        particles.v = v if v is not None else np.zeros(x.shape)
+        particles.a = a if a is not None else np.zeros(x.shape)
+        particles.mass = mass
+        particles.PE = np.zeros(particles.n)
+        particles.E_init = np.zeros(particles.n)
+        particles.has_mass = has_mass
+        particles.update_sources()
+        return particles
+
+    # Returns the number of particles
+    def __len__ (self) -> int:
+        return self.n
+
+    # Updates the indices of the sources and tracers from the mass flags
+    def update_sources (self):
+        self.sources = np.flatnonzero(self.has_mass)
+        self.tracers = np.flatnonzero(~self.has_mass)
+
+
+
+
+# A state that reads and writes a single row of the particle arrays
+# Vectors returned are copies, so changes must be assigned back to the state
+class ParticleState (State):
+
+    # Creates the view onto some particle index
+    def __init__ (self, particles: Particles, index: int):
+        self.particles = particles
+        self.index = index
+
+    # The position of the particle
+    @property
+    def x (self) -> Vector:
+        return Vector(*self.particles.x[self.index].tolist())
+
+    @x.setter
+    def x (self, value: Vector):
+        self.particles.x[self.index] = list(value)
+
+    # The velocity of the particle
+    @property
+    def v (self) -> Vector:
+        return Vector(*self.particles.v[self.index].tolist())
+
+    @v.setter
+    def v (self, value: Vector):
+        self.particles.v[self.index] = list(value)
+
+    # The acceleration of the particle
+    @property
+    def a (self) -> Vector:
+        return Vector(*self.particles.a[self.index].tolist())
+
+    @a.setter
+    def a (self, value: Vector):
+        self.particles.a[self.index] = list(value)
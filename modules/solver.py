@@ -0,0 +1,1130 @@
+import os
+import numpy as np
+from multiprocessing import get_context, shared_memory
+from concurrent.futures import ThreadPoolExecutor
+from .particles import Particles
+from . import kernels
+from .constants import *
+
+
+
+# Base gravity solver
+# Calculates the accelerations and potentials of some target particles
+# due to all of the particles in the system that have mass
+class Solver:
+
+    # The softening length, where zero uses the unsoftened Newtonian kernel
+    softening = 0.0
+
+    # The softening kernel, which can be "plummer" or "spline"
+    kernel = "plummer"
+
+    # The ratio of the spline kernel length to the softening length
+    # The spline potential at zero separation then matches a plummer kernel of the same softening
+    SPLINE_LENGTH = 2.8
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, name: str, **kwargs):
+        self.name = name
+        self.__dict__.update(kwargs)
+
+    # Calculates the accelerations (T, 3) and potentials per unit mass (T) of the target particles
+    # Both are calculated in a single pass over the sources
+    # This function must be overriden by the solver class
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+        targets = self.get_targets(particles, targets)
+        return np.zeros((targets.size, 3)), np.zeros(targets.size)
+
+    # Calculates the accelerations (T, 3), jerks (T, 3) and potentials (T) of the target particles
+    # This function must be overriden by solvers that can calculate the jerks
+    def evaluate_jerk (self, particles: Particles, targets = None) -> tuple:
+        raise Exception("Invalid solver used.")
+
+    # Calculates the accelerations of the target particles (T, 3)
+    def accelerations (self, particles: Particles, targets = None) -> np.ndarray:
+        return self.evaluate(particles, targets)[0]
+
+    # Calculates the potentials per unit mass of the target particles (T)
+    def potentials (self, particles: Particles, targets = None) -> np.ndarray:
+        return self.evaluate(particles, targets)[1]
+
+    # Prepares the solver before an integration
+    # The number of threads can be set by the integrator, if the solver uses threads
+    def start (self, particles: Particles, threads: int = None):
+        pass
+
+    # Cleans up the solver after an integration
+    def stop (self, particles: Particles):
+        pass
+
+    # Calculates the softened inverse distances and inverse cubed distances from the squared distances
+    # Bodies at the same position are ignored by setting both to zero
+    def soften (self, r2: np.ndarray) -> tuple:
+        if self.kernel not in ["plummer", "spline"]:
+            raise Exception("Invalid softening kernel used.")
+        inv = np.zeros(r2.shape)
+        mask = r2 > 0
+
+        # The plummer kernel, which is also used without softening
+        if self.kernel == "plummer" or self.softening == 0:
+            np.divide(1.0, np.sqrt(r2 + self.softening ** 2), out=inv, where=mask)
+            return inv, inv * inv * inv
+
+        # The cubic spline kernel, which is Newtonian beyond the spline length
+        np.divide(1.0, np.sqrt(r2), out=inv, where=mask)
+        inv3 = inv * inv * inv
+        h = self.SPLINE_LENGTH * self.softening
+        u = np.sqrt(r2) / h
+
+        # Add the inner and outer parts of the spline
+        inner = mask & (u < 0.5)
+        ui = u[inner]
+        inv[inner] = (14.0 / 5.0 - 16.0 / 3.0 * ui ** 2 + 48.0 / 5.0 * ui ** 4 - 32.0 / 5.0 * ui ** 5) / h
+        inv3[inner] = (32.0 / 3.0 - 192.0 / 5.0 * ui ** 2 + 32.0 * ui ** 3) / h ** 3
+        outer = mask & (u >= 0.5) & (u < 1.0)
+        uo = u[outer]
+        inv[outer] = (-1.0 / (15.0 * uo) + 16.0 / 5.0 - 32.0 / 3.0 * uo ** 2 + 16.0 * uo ** 3 - 48.0 / 5.0 * uo ** 4 + 32.0 / 15.0 * uo ** 5) / h
+        inv3[outer] = (64.0 / 3.0 - 48.0 * uo + 192.0 / 5.0 * uo ** 2 - 32.0 / 3.0 * uo ** 3 - 1.0 / (15.0 * uo ** 3)) / h ** 3
+        return inv, inv3
+
+    # Calculates the radial derivatives of the softened inverse cubed distances over the distances
+    # These are used to calculate the jerks, and are zero for bodies at the same position
+    def soften_derivative (self, r2: np.ndarray) -> np.ndarray:
+        inv, inv3 = self.soften(r2)
+
+        # The plummer kernel, which is also used without softening
+        if self.kernel == "plummer" or self.softening == 0:
+            return -3.0 * inv3 * inv * inv
+
+        # The cubic spline kernel, which is Newtonian beyond the spline length
+        h = self.SPLINE_LENGTH * self.softening
+        u = np.sqrt(r2) / h
+        derivative = -3.0 * inv3 * inv * inv
+        inner = (r2 > 0) & (u < 0.5)
+        ui = u[inner]
+        derivative[inner] = (-384.0 / 5.0 + 96.0 * ui) / h ** 5
+        outer = (u >= 0.5) & (u < 1.0)
+        uo = u[outer]
+        derivative[outer] = (-48.0 + 384.0 / 5.0 * uo - 32.0 * uo ** 2 + 1.0 / (5.0 * uo ** 4)) / (uo * h ** 5)
+        return derivative
+
+    # Returns the indices of the target particles, which defaults to all particles
+    @staticmethod
+    def get_targets (particles: Particles, targets = None) -> np.ndarray:
+        if targets is None:
+            return np.arange(particles.n)
+        return np.atleast_1d(np.asarray(targets, dtype=int))
+
+
+    ##########################################################################
+    # Solver Selection
+
+    # Returns a solver from some key, or the solver itself if already created
+    @staticmethod
+    def create (solver, **kwargs):
+        if isinstance(solver, Solver):
+            return solver
+        if solver not in SOLVER_KEYS:
+            raise Exception("Invalid solver name used.")
+        return SOLVER_KEYS[solver](**kwargs)
+
+
+    ##########################################################################
+    # Accuracy Functions
+
+    # Compares the solver against some reference solver
+    # Returns the relative errors of the accelerations and potentials
+    def compare (self, particles: Particles, reference = None) -> dict:
+        reference = reference if reference else DirectSolver()
+
+        # Calculate the accelerations and potentials from both solvers
+        a, pot = self.evaluate(particles)
+        a_ref, pot_ref = reference.evaluate(particles)
+
+        # Calculate the relative errors, ignoring particles with no field
+        a_mag = np.linalg.norm(a_ref, axis=1)
+        a_err = np.linalg.norm(a - a_ref, axis=1)[a_mag > 0] / a_mag[a_mag > 0]
+        pot_err = np.abs(pot - pot_ref)[pot_ref != 0] / np.abs(pot_ref[pot_ref != 0])
+
+        # Return the error statistics
+        return {
+            "acc_median":   np.median(a_err) if a_err.size else 0.0,
+            "acc_p99":      np.percentile(a_err, 99) if a_err.size else 0.0,
+            "acc_max":      np.max(a_err) if a_err.size else 0.0,
+            "pot_median":   np.median(pot_err) if pot_err.size else 0.0,
+            "pot_max":      np.max(pot_err) if pot_err.size else 0.0,
+        }
+
+    ##########################################################################
+
+
+
+
+
+# Direct summation solver
+# Calculates the effects of every source on every target in O(N^2)
+class DirectSolver (Solver):
+
+    # The number of bodies in each tile, which bounds the memory of each evaluation
+    tile_size = 256
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, **kwargs):
+        super().__init__("direct", **kwargs)
+
+    # Calculates the accelerations and potentials of the target particles
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+
+        # Get the targets and split them into the bodies with mass and the massless tracers
+        targets = self.get_targets(particles, targets)
+        a = np.zeros((targets.size, 3))
+        pot = np.zeros(targets.size)
+        massive = particles.has_mass[targets]
+        sources = particles.sources
+        if sources.size == 0: return a, pot
+
+        # Calculate the interactions between the bodies with mass
+        # Each pair is visited once if all of the bodies with mass are targets
+        if np.array_equal(targets[massive], sources):
+            a[massive], pot[massive] = self.symmetric(particles, sources)
+        else:
+            a[massive], pot[massive] = self.pairwise(particles, targets[massive], sources)
+
+        # Calculate the effects of the bodies with mass on the tracers
+        a[~massive], pot[~massive] = self.pairwise(particles, targets[~massive], sources)
+
+        # Return the accelerations and potentials
+        return a, pot
+
+
+    # Calculates the accelerations and potentials of some sources due to each other
+    # Each pair of tiles is visited once and gives equal and opposite contributions to both bodies
+    def symmetric (self, particles: Particles, sources: np.ndarray) -> tuple:
+        x = particles.x[sources]
+        mass = -1.0 * G * particles.mass[sources]
+        a = np.zeros((sources.size, 3))
+        pot = np.zeros(sources.size)
+
+        # Loop through the upper triangle of pairs of tiles
+        for lo_i in range(0, sources.size, self.tile_size):
+            tile_i = slice(lo_i, lo_i + self.tile_size)
+            for lo_j in range(lo_i, sources.size, self.tile_size):
+                tile_j = slice(lo_j, lo_j + self.tile_size)
+                distance, inv, inv3 = self.tile(x[tile_i], x[tile_j])
+
+                # Add the effects of the second tile on the first tile
+                pot[tile_i] += inv @ mass[tile_j]
+                a[tile_i] += np.einsum("ij,ijk->ik", inv3 * mass[tile_j], distance)
+
+                # Add the opposite effects of the first tile on the second tile
+                if lo_j != lo_i:
+                    pot[tile_j] += mass[tile_i] @ inv
+                    a[tile_j] -= np.einsum("ij,ijk->jk", inv3 * mass[tile_i, np.newaxis], distance)
+
+        # Return the accelerations and potentials
+        return a, pot
+
+
+    # Calculates the accelerations and potentials of some targets due to some sources
+    # The targets and sources are split into tiles so the memory used is bounded
+    def pairwise (self, particles: Particles, targets: np.ndarray, sources: np.ndarray) -> tuple:
+        x_s = particles.x[sources]
+        mass = -1.0 * G * particles.mass[sources]
+        a = np.zeros((targets.size, 3))
+        pot = np.zeros(targets.size)
+
+        # Loop through all pairs of target and source tiles
+        for lo_i in range(0, targets.size, self.tile_size):
+            tile_i = slice(lo_i, lo_i + self.tile_size)
+            x = particles.x[targets[tile_i]]
+            for lo_j in range(0, sources.size, self.tile_size):
+                tile_j = slice(lo_j, lo_j + self.tile_size)
+                distance, inv, inv3 = self.tile(x, x_s[tile_j])
+
+                # Add the effects of the sources on the targets
+                pot[tile_i] += inv @ mass[tile_j]
+                a[tile_i] += np.einsum("ij,ijk->ik", inv3 * mass[tile_j], distance)
+
+        # Return the accelerations and potentials
+        return a, pot
+
+
+    # Calculates the accelerations, jerks and potentials of the target particles in a single pass
+    # The jerks are the time derivatives of the accelerations from the relative velocities
+    def evaluate_jerk (self, particles: Particles, targets = None) -> tuple:
+        targets = self.get_targets(particles, targets)
+        sources = particles.sources
+        x_s = particles.x[sources]
+        v_s = particles.v[sources]
+        mass = -1.0 * G * particles.mass[sources]
+        a = np.zeros((targets.size, 3))
+        jerk = np.zeros((targets.size, 3))
+        pot = np.zeros(targets.size)
+
+        # Loop through all pairs of target and source tiles
+        for lo_i in range(0, targets.size, self.tile_size):
+            tile_i = slice(lo_i, lo_i + self.tile_size)
+            x = particles.x[targets[tile_i]]
+            v = particles.v[targets[tile_i]]
+            for lo_j in range(0, sources.size, self.tile_size):
+                tile_j = slice(lo_j, lo_j + self.tile_size)
+                distance, inv, inv3 = self.tile(x, x_s[tile_j])
+                velocity = v[:, np.newaxis, :] - v_s[np.newaxis, tile_j, :]
+                derivative = self.soften_derivative(np.einsum("ijk,ijk->ij", distance, distance))
+                rv = np.einsum("ijk,ijk->ij", distance, velocity)
+
+                # Add the effects of the sources on the targets
+                pot[tile_i] += inv @ mass[tile_j]
+                a[tile_i] += np.einsum("ij,ijk->ik", inv3 * mass[tile_j], distance)
+                jerk[tile_i] += np.einsum("ij,ijk->ik", inv3 * mass[tile_j], velocity) \
+                    + np.einsum("ij,ijk->ik", derivative * rv * mass[tile_j], distance)
+
+        # Return the accelerations, jerks and potentials
+        return a, jerk, pot
+
+
+    # Calculates the distances and softened inverse distances between two tiles of bodies
+    # Bodies at the same position are ignored by setting their inverse distance to zero
+    def tile (self, x_i: np.ndarray, x_j: np.ndarray) -> tuple:
+        distance = x_i[:, np.newaxis, :] - x_j[np.newaxis, :, :]
+        inv, inv3 = self.soften(np.einsum("ijk,ijk->ij", distance, distance))
+        return distance, inv, inv3
+
+    ##########################################################################
+
+
+
+
+
+# Barnes-Hut tree solver
+# Groups distant sources into octree nodes and uses the node monopoles in O(N log N)
+class TreeSolver (Solver):
+
+    # The opening angle, where smaller angles are more accurate
+    theta = 0.5
+
+    # The maximum number of sources in a leaf node
+    leaf_size = 8
+
+    # The maximum depth of the tree
+    max_depth = 32
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, **kwargs):
+        super().__init__("tree", **kwargs)
+
+
+    ##########################################################################
+    # Tree Functions
+
+    # Builds the octree from the particles that have mass
+    def build (self, particles: Particles):
+
+        # Stores the properties of each node
+        self.node_center = []
+        self.node_size = []
+        self.node_mass = []
+        self.node_com = []
+        self.node_children = []
+        self.node_sources = []
+
+        # Only bodies with mass are inserted into the tree
+        sources = particles.sources
+        if sources.size == 0: return
+        x = particles.x[sources]
+
+        # Create the root node around all the sources
+        lower = np.min(x, axis=0)
+        upper = np.max(x, axis=0)
+        size = max(np.max(upper - lower), 1e-12)
+        self.add_node(particles, 0.5 * (lower + upper), size, sources, 0)
+
+        # Finalise the node arrays
+        self.node_center = np.array(self.node_center)
+        self.node_size = np.array(self.node_size)
+        self.node_mass = np.array(self.node_mass)
+        self.node_com = np.array(self.node_com)
+
+
+    # Adds a node containing some sources and returns its index
+    def add_node (self, particles: Particles, center: np.ndarray, size: float, sources: np.ndarray, depth: int) -> int:
+
+        # Calculate the mass and centre of mass of the node
+        mass = particles.mass[sources]
+        mass_total = np.sum(mass)
+        com = (mass @ particles.x[sources]) / mass_total
+
+        # Add the node
+        idx = len(self.node_size)
+        self.node_center.append(center)
+        self.node_size.append(size)
+        self.node_mass.append(mass_total)
+        self.node_com.append(com)
+        self.node_children.append([])
+        self.node_sources.append(sources)
+
+        # Leaf nodes keep their sources
+        if sources.size <= self.leaf_size or depth >= self.max_depth:
+            return idx
+
+        # Split the sources into the eight octants
+        upper = particles.x[sources] >= center
+        octant = upper[:, 0] * 4 + upper[:, 1] * 2 + upper[:, 2]
+        for oct in range(8):
+            child_sources = sources[octant == oct]
+            if child_sources.size == 0: continue
+            offset = (np.array([oct >> 2, (oct >> 1) & 1, oct & 1]) - 0.5) * 0.5 * size
+            child = self.add_node(particles, center + offset, 0.5 * size, child_sources, depth + 1)
+            self.node_children[idx].append(child)
+
+        return idx
+
+
+    # Calculates the accelerations and potentials of the target particles by walking the tree
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+
+        # Get the targets and build the tree
+        targets = self.get_targets(particles, targets)
+        a = np.zeros((targets.size, 3))
+        pot = np.zeros(targets.size)
+        self.build(particles)
+        if len(self.node_size) == 0: return a, pot
+        x = particles.x[targets]
+
+        # Walk the tree with the groups of targets that need to open each node
+        stack = [(0, np.arange(targets.size))]
+        while stack:
+            node, group = stack.pop()
+
+            # Leaf nodes are summed directly, ignoring bodies at the same position
+            if len(self.node_children[node]) == 0:
+                sources = self.node_sources[node]
+                distance = x[group, np.newaxis, :] - particles.x[np.newaxis, sources, :]
+                inv, inv3 = self.soften(np.einsum("ijk,ijk->ij", distance, distance))
+                mass = -1.0 * G * particles.mass[sources]
+                a[group] += np.einsum("ij,ijk->ik", inv3 * mass, distance)
+                pot[group] += inv @ mass
+                continue
+
+            # Nodes that are far enough away and do not contain the target use the monopole
+            distance = x[group] - self.node_com[node]
+            mag = np.sqrt(np.einsum("ij,ij->i", distance, distance))
+            inside = np.all(np.abs(x[group] - self.node_center[node]) <= 0.5 * self.node_size[node], axis=1)
+            far = (self.node_size[node] < self.theta * mag) & ~inside
+
+            # Add the node monopole to the far targets
+            mass = -1.0 * G * self.node_mass[node]
+            inv, inv3 = self.soften(mag[far] ** 2)
+            a[group[far]] += (mass * inv3)[:, np.newaxis] * distance[far]
+            pot[group[far]] += mass * inv
+
+            # Open the node for the near targets
+            near = group[~far]
+            if near.size == 0: continue
+            for child in self.node_children[node]:
+                stack.append((child, near))
+
+        # Return the accelerations and potentials
+        return a, pot
+
+    ##########################################################################
+
+
+
+# Fast multipole method solver
+# Uses cartesian multipole and local expansions on a uniform octree in O(N)
+class FMMSolver (Solver):
+
+    # The order of the multipole and local expansions
+    order = 4
+
+    # The average number of sources in a leaf cell used to choose the tree depth
+    leaf_size = 32
+
+    # The maximum depth of the tree, which must be at least 2 for the cells to interact
+    max_level = 7
+
+    # The maximum number of near pairs evaluated at once
+    max_pairs = 2000000
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver and the expansion terms
+    def __init__ (self, **kwargs):
+        super().__init__("fmm", **kwargs)
+        if self.max_level < 2:
+            raise Exception("Invalid max level used.")
+        self.setup_terms()
+
+
+    ##########################################################################
+    # Expansion Functions
+
+    # Creates the multi-indices of the expansion terms up to the order
+    def setup_terms (self):
+        p = self.order
+        self.terms = [(i, j, n - i - j) for n in range(p + 1) for i in range(n, -1, -1) for j in range(n - i, -1, -1)]
+        self.term_index = {term: idx for idx, term in enumerate(self.terms)}
+        self.term_order = np.array([sum(term) for term in self.terms])
+        self.term_factorial = np.array([np.prod([np.prod(np.arange(1, k + 1)) for k in term]) for term in self.terms], dtype=float)
+
+        # The terms shifted by one in each direction, used for the gradient of the local expansion
+        self.gradient_terms = []
+        for d in range(3):
+            lower = [idx for idx, term in enumerate(self.terms) if sum(term) < p]
+            upper = [self.term_index[tuple(k + (1 if d == e else 0) for e, k in enumerate(self.terms[idx]))] for idx in lower]
+            self.gradient_terms.append((np.array(lower, dtype=int), np.array(upper, dtype=int)))
+
+        # The pairs of terms whose combined order is within the order of the expansion
+        self.m2l_pairs = [(k, n, self.term_index[tuple(a + b for a, b in zip(self.terms[k], self.terms[n]))]) \
+            for k in range(len(self.terms)) for n in range(len(self.terms)) if self.term_order[k] + self.term_order[n] <= p]
+
+        # The pairs of terms used to shift an expansion, where the first term contains the second
+        self.shift_pairs = np.array([(n, k, self.term_index[tuple(a - b for a, b in zip(self.terms[n], self.terms[k]))]) \
+            for n in range(len(self.terms)) for k in range(len(self.terms)) \
+            if all(a >= b for a, b in zip(self.terms[n], self.terms[k]))], dtype=int)
+
+        # The cell offsets whose parents neighbour each other, but which are not neighbours
+        # The offsets are valid depending on the parity of the target cell
+        offsets = np.array([(i, j, k) for i in range(-3, 4) for j in range(-3, 4) for k in range(-3, 4)])
+        self.m2l_offsets = offsets[np.max(np.abs(offsets), axis=1) > 1]
+        self.near_offsets = offsets[np.max(np.abs(offsets), axis=1) <= 1]
+        self.m2l_unit = self.m2l_matrices(self.m2l_offsets)
+        parities = np.array([(p >> 2, (p >> 1) & 1, p & 1) for p in range(8)])
+        parent_offsets = (parities[np.newaxis, :, :] + self.m2l_offsets[:, np.newaxis, :]) // 2
+        self.m2l_valid = np.all(np.abs(parent_offsets) <= 1, axis=2)
+
+    # Returns the monomials (x^n / n!) of some displacements for all terms (R, K)
+    def monomials (self, d: np.ndarray) -> np.ndarray:
+        powers = d[:, :, np.newaxis] ** np.arange(self.order + 1)
+        terms = np.array(self.terms)
+        return powers[:, 0, terms[:, 0]] * powers[:, 1, terms[:, 1]] * powers[:, 2, terms[:, 2]] / self.term_factorial
+
+    # Returns the derivatives of 1 / r for some displacements for all terms (R, K)
+    def derivatives (self, d: np.ndarray) -> np.ndarray:
+        r2 = np.einsum("ij,ij->i", d, d)
+        D = np.zeros((len(d), len(self.terms)))
+        D[:, 0] = 1.0 / np.sqrt(r2)
+
+        # Use the recurrence relation for the cartesian derivatives of 1 / r
+        for idx, term in enumerate(self.terms[1:], 1):
+            n = sum(term)
+            for e in range(3):
+                if term[e] >= 1:
+                    lower = tuple(k - (1 if e == f else 0) for f, k in enumerate(term))
+                    D[:, idx] -= (2 * n - 1) * term[e] * d[:, e] * D[:, self.term_index[lower]]
+                if term[e] >= 2:
+                    lower = tuple(k - (2 if e == f else 0) for f, k in enumerate(term))
+                    D[:, idx] -= (n - 1) * term[e] * (term[e] - 1) * D[:, self.term_index[lower]]
+            D[:, idx] /= n * r2
+
+        return D
+
+    # Returns the multipole to local matrices for some unit cell offsets (O, K, K)
+    # The offset is the position of the source cell relative to the target cell
+    def m2l_matrices (self, offsets: np.ndarray) -> np.ndarray:
+        D = self.derivatives(-1.0 * offsets.astype(float))
+        T = np.zeros((len(offsets), len(self.terms), len(self.terms)))
+        for k, n, kn in self.m2l_pairs:
+            T[:, k, n] = (-1.0) ** self.term_order[n] * D[:, kn]
+        return T
+
+    # Returns the matrices that shift the multipoles of the eight children to their parent (8, K, K)
+    def m2m_matrices (self, size_child: float) -> np.ndarray:
+        shifts = (np.array([(p >> 2, (p >> 1) & 1, p & 1) for p in range(8)]) - 0.5) * size_child
+        mono = self.monomials(shifts)
+        A = np.zeros((8, len(self.terms), len(self.terms)))
+        n, k, diff = self.shift_pairs.T
+        A[:, n, k] = mono[:, diff]
+        return A
+
+
+    ##########################################################################
+    # Tree Functions
+
+    # Returns the keys of some cell coordinates on a grid with n cells per side
+    @staticmethod
+    def get_keys (coords: np.ndarray, n: int) -> np.ndarray:
+        return (coords[:, 0] * n + coords[:, 1]) * n + coords[:, 2]
+
+    # Returns the unique cells at some level containing some cell coordinates
+    # Returns the cell coordinates, the cell of each coordinate and the map from keys to cells
+    @staticmethod
+    def get_cells (coords: np.ndarray, n: int) -> tuple:
+        keys = FMMSolver.get_keys(coords, n)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        cells = np.stack([unique // (n * n), (unique // n) % n, unique % n], axis=1)
+        index = np.full(n ** 3, -1, dtype=int)
+        index[unique] = np.arange(unique.size)
+        return cells, inverse.reshape(-1), index
+
+    # Returns the cells of some index map at some coordinates, or -1 if outside the grid or empty
+    @staticmethod
+    def find_cells (coords: np.ndarray, index: np.ndarray, n: int) -> np.ndarray:
+        valid = np.all((coords >= 0) & (coords < n), axis=1)
+        keys = FMMSolver.get_keys(coords, n)
+        return np.where(valid, index[np.where(valid, keys, 0)], -1)
+
+
+    # Calculates the accelerations and potentials of the target particles
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+
+        # Get the targets and sources
+        targets = self.get_targets(particles, targets)
+        sources = particles.sources
+        a = np.zeros((targets.size, 3))
+        pot = np.zeros(targets.size)
+        if sources.size == 0 or targets.size == 0: return a, pot
+        x_t = particles.x[targets]
+        x_s = particles.x[sources]
+        m_s = particles.mass[sources]
+
+        # Create the root cell around all the particles
+        lower = np.minimum(np.min(x_t, axis=0), np.min(x_s, axis=0))
+        upper = np.maximum(np.max(x_t, axis=0), np.max(x_s, axis=0))
+        size = max(np.max(upper - lower), 1e-12) * (1.0 + 1e-9)
+        n = 2 ** self.max_level
+        coords_s = np.clip(((x_s - lower) / size * n).astype(int), 0, n - 1)
+        coords_t = np.clip(((x_t - lower) / size * n).astype(int), 0, n - 1)
+
+        # The leaf cells are no smaller than the softening, so the expansions are only used beyond it
+        max_level = self.max_level
+        if self.softening > 0:
+            max_level = min(max_level, max(2, int(np.log2(size / (self.SPLINE_LENGTH * self.softening)))))
+
+        # Choose the depth of the tree where a source shares its leaf cell with about leaf_size sources
+        for levels in range(2, max_level + 1):
+            shift = self.max_level - levels
+            count = np.unique(self.get_keys(coords_s >> shift, 2 ** levels), return_counts=True)[1]
+            if np.sum(count ** 2) <= self.leaf_size * sources.size: break
+
+        # Get the source and target cells at every level, from the leaves up to the root
+        n = 2 ** levels
+        coords_s = coords_s >> (self.max_level - levels)
+        coords_t = coords_t >> (self.max_level - levels)
+        source_cells, target_cells = [], []
+        for level in range(levels, -1, -1):
+            shift = levels - level
+            source_cells.insert(0, self.get_cells(coords_s >> shift, 2 ** level))
+            target_cells.insert(0, self.get_cells(coords_t >> shift, 2 ** level))
+
+        # Calculate the multipoles of the leaf cells from the sources
+        cells, inverse, index = source_cells[levels]
+        centers = lower + (cells + 0.5) * (size / n)
+        mono = self.monomials(x_s - centers[inverse]) * m_s[:, np.newaxis]
+        M = [None] * (levels + 1)
+        M[levels] = np.stack([np.bincount(inverse, weights=mono[:, k], minlength=len(cells)) \
+            for k in range(len(self.terms))], axis=1)
+
+        # Shift the multipoles from the children up to the parents
+        for level in range(levels, 0, -1):
+            cells = source_cells[level][0]
+            parents, parent_index = source_cells[level - 1][0], source_cells[level - 1][2]
+            A = self.m2m_matrices(size / 2 ** level)
+            M[level - 1] = np.zeros((len(parents), len(self.terms)))
+            parent_rows = self.find_cells(cells >> 1, parent_index, 2 ** (level - 1))
+            parity = (cells[:, 0] & 1) * 4 + (cells[:, 1] & 1) * 2 + (cells[:, 2] & 1)
+            for p in range(8):
+                rows = parity == p
+                M[level - 1][parent_rows[rows]] += M[level][rows] @ A[p].T
+
+        # Calculate the local expansions from the well separated cells and shift them down to the children
+        L = [np.zeros((len(target_cells[level][0]), len(self.terms))) for level in range(levels + 1)]
+        scale = self.term_order[:, np.newaxis] + self.term_order[np.newaxis, :] + 1
+        for level in range(2, levels + 1):
+            cells, n_level = target_cells[level][0], 2 ** level
+            source_index = source_cells[level][2]
+
+            # Shift the parent local expansions down, which is the transpose of the multipole shift
+            parent_rows = self.find_cells(cells >> 1, target_cells[level - 1][2], 2 ** (level - 1))
+            parity = (cells[:, 0] & 1) * 4 + (cells[:, 1] & 1) * 2 + (cells[:, 2] & 1)
+            A = self.m2m_matrices(size / n_level)
+            for p in range(8):
+                rows = parity == p
+                L[level][rows] += L[level - 1][parent_rows[rows]] @ A[p]
+
+            # Add the well separated source cells whose parents neighbour the parent of the target
+            T = self.m2l_unit * (-1.0 * G) / (size / n_level) ** scale
+            for o, offset in enumerate(self.m2l_offsets):
+                valid = self.m2l_valid[o][parity]
+                source_rows = self.find_cells(cells + offset, source_index, n_level)
+                rows = np.flatnonzero(valid & (source_rows >= 0))
+                if rows.size == 0: continue
+                L[level][rows] += M[level][source_rows[rows]] @ T[o].T
+
+        # Evaluate the local expansions at the targets
+        cells, inverse, index = target_cells[levels]
+        centers = lower + (cells + 0.5) * (size / n)
+        mono = self.monomials(x_t - centers[inverse])
+        L_t = L[levels][inverse]
+        pot += np.einsum("ij,ij->i", L_t, mono)
+        for d, (lower_terms, upper_terms) in enumerate(self.gradient_terms):
+            a[:, d] -= np.einsum("ij,ij->i", L_t[:, upper_terms], mono[:, lower_terms])
+
+        # Sort the sources by their leaf cell and store each axis contiguously
+        cells_s, inverse_s, index_s = source_cells[levels]
+        order = np.argsort(inverse_s, kind="stable")
+        x_s, m_s = np.ascontiguousarray(x_s[order].T), -1.0 * G * m_s[order]
+        x_t = np.ascontiguousarray(x_t.T)
+        count = np.bincount(inverse_s, minlength=len(cells_s))
+        start = np.cumsum(count) - count
+
+        # Add the neighbouring sources directly, ignoring bodies at the same position
+        for offset in self.near_offsets:
+            rows = self.find_cells(coords_t + offset, index_s, n)
+            n_pairs = np.where(rows >= 0, count[rows], 0)
+            total = np.cumsum(n_pairs)
+            if total[-1] == 0: continue
+
+            # Split the targets into chunks with a bounded number of pairs
+            bounds = np.searchsorted(total, np.arange(self.max_pairs, total[-1], self.max_pairs), side="right")
+            for lo, hi in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [targets.size]])):
+                if hi <= lo: continue
+                i = np.repeat(np.arange(lo, hi), n_pairs[lo:hi])
+                if i.size == 0: continue
+                first = np.cumsum(n_pairs[lo:hi]) - n_pairs[lo:hi]
+                j = start[rows[i]] + np.arange(i.size) - first[i - lo]
+                distance = [x_t[d][i] - x_s[d][j] for d in range(3)]
+                inv, inv3 = self.soften(distance[0] ** 2 + distance[1] ** 2 + distance[2] ** 2)
+                mass = m_s[j]
+                pot_fac = mass * inv
+                a_fac = mass * inv3
+                for d in range(3):
+                    a[:, d] += np.bincount(i, weights=a_fac * distance[d], minlength=targets.size)
+                pot += np.bincount(i, weights=pot_fac, minlength=targets.size)
+
+        # Return the accelerations and potentials
+        return a, pot
+
+    ##########################################################################
+
+
+
+
+
+# Particle mesh solver
+# Assigns the sources to a grid and solves for the potential with fast fourier transforms
+# The grid is padded to twice its size so the bodies are isolated rather than periodic
+class MeshSolver (Solver):
+
+    # The number of grid cells along each side
+    grid_size = 64
+
+    # The mass assignment scheme, either cloud in cell ("cic") or triangular shaped cloud ("tsc")
+    assignment = "cic"
+
+    # The side length of the grid, or None to fit the grid around the bodies
+    box_size = None
+
+    # The centre of the grid, or None to fit the grid around the bodies
+    box_center = None
+
+    # The potential of a uniform cube of unit size and mass at its centre
+    CUBE_POTENTIAL = 2.3800772
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, **kwargs):
+        super().__init__("mesh", **kwargs)
+        self.green = None
+
+
+    ##########################################################################
+    # Mesh Functions
+
+    # Returns the first cell and the weights along each axis of the assignment stencil
+    # The positions are in units of cells (P, 3)
+    def weights (self, u: np.ndarray) -> tuple:
+        if self.assignment == "cic":
+            first = np.floor(u - 0.5).astype(int)
+            f = u - 0.5 - first
+            return first, np.stack([1.0 - f, f], axis=2)
+        if self.assignment == "tsc":
+            nearest = np.floor(u).astype(int)
+            d = u - nearest - 0.5
+            return nearest - 1, np.stack([0.5 * (0.5 - d) ** 2, 0.75 - d ** 2, 0.5 * (0.5 + d) ** 2], axis=2)
+        raise Exception("Invalid mass assignment scheme used.")
+
+    # Returns the cell offsets and weights of the full three dimensional stencil (P, S^3)
+    def stencil (self, u: np.ndarray) -> tuple:
+        first, w = self.weights(u)
+        s = w.shape[2]
+        offsets = np.array([(i, j, k) for i in range(s) for j in range(s) for k in range(s)])
+        weights = w[:, 0, offsets[:, 0]] * w[:, 1, offsets[:, 1]] * w[:, 2, offsets[:, 2]]
+        return first, offsets, weights
+
+    # Returns the flattened cells of the stencil (P, S^3)
+    def stencil_cells (self, first: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+        n = self.grid_size
+        cells = first[:, np.newaxis, :] + offsets[np.newaxis, :, :]
+        return (cells[:, :, 0] * n + cells[:, :, 1]) * n + cells[:, :, 2]
+
+    # Returns the green's function of 1 / r on the padded grid for cells of unit size
+    def green_function (self) -> np.ndarray:
+        n = self.grid_size
+        k = np.arange(2 * n)
+        k = np.minimum(k, 2 * n - k)
+        r = np.sqrt(k[:, None, None] ** 2 + k[None, :, None] ** 2 + k[None, None, :] ** 2)
+        g = np.divide(1.0, r, out=np.zeros(r.shape), where=r > 0)
+        g[0, 0, 0] = self.CUBE_POTENTIAL
+        return g
+
+
+    # Calculates the accelerations and potentials of the target particles
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+
+        # Get the targets and sources
+        targets = self.get_targets(particles, targets)
+        sources = particles.sources
+        a = np.zeros((targets.size, 3))
+        pot = np.zeros(targets.size)
+        if sources.size == 0 or targets.size == 0: return a, pot
+        x_t = particles.x[targets]
+        x_s = particles.x[sources]
+        m_s = particles.mass[sources]
+
+        # Fit the grid around the bodies, leaving room for the stencil at the edges
+        n = self.grid_size
+        lower = np.minimum(np.min(x_t, axis=0), np.min(x_s, axis=0))
+        upper = np.maximum(np.max(x_t, axis=0), np.max(x_s, axis=0))
+        center = 0.5 * (lower + upper) if self.box_center is None else np.array(list(self.box_center), dtype=float)
+        size = max(np.max(upper - lower), 1e-12) if self.box_size is None else self.box_size
+        h = size / (n - 4)
+        lower = center - 0.5 * n * h
+
+        # Assign the source masses to the grid
+        first, offsets, weights = self.stencil((x_s - lower) / h)
+        cells = self.stencil_cells(first, offsets)
+        inside = np.all((first >= 0) & (first + offsets[-1] < n), axis=1)
+        mass = np.bincount(cells[inside].ravel(), weights=(weights[inside] * m_s[inside, np.newaxis]).ravel(), \
+            minlength=n ** 3).reshape(n, n, n)
+
+        # Solve for the potential by convolving with the padded green's function
+        if self.green is None or self.green.shape[0] != 2 * n:
+            self.green = np.fft.rfftn(self.green_function())
+        phi = np.fft.irfftn(np.fft.rfftn(mass, s=(2 * n,) * 3) * self.green, s=(2 * n,) * 3)[:n, :n, :n]
+        phi *= -1.0 * G / h
+
+        # Calculate the acceleration on the grid from the gradient of the potential
+        field = np.stack([-1.0 * g for g in np.gradient(phi, h)], axis=3).reshape(n ** 3, 3)
+        phi = phi.ravel()
+
+        # Interpolate the accelerations and potentials to the targets with the same stencil
+        first, offsets, weights = self.stencil((x_t - lower) / h)
+        cells = self.stencil_cells(first, offsets)
+        inside = np.all((first >= 0) & (first + offsets[-1] < n), axis=1)
+        cells, weights = cells[inside], weights[inside]
+        a[inside] = np.einsum("ps,psk->pk", weights, field[cells])
+        pot[inside] = np.einsum("ps,ps->p", weights, phi[cells])
+
+        # Remove the potential of each source from its own assigned mass
+        r = np.linalg.norm(offsets[:, np.newaxis, :] - offsets[np.newaxis, :, :], axis=2)
+        self_green = np.divide(1.0, r, out=np.full(r.shape, self.CUBE_POTENTIAL), where=r > 0)
+        is_source = particles.has_mass[targets][inside]
+        self_pot = -1.0 * G * particles.mass[targets][inside] / h * np.einsum("pa,ab,pb->p", weights, self_green, weights)
+        pot[np.flatnonzero(inside)[is_source]] -= self_pot[is_source]
+
+        # Return the accelerations and potentials
+        return a, pot
+
+    ##########################################################################
+
+
+
+
+
+# Compiled direct summation solver
+# Uses a Numba kernel that is parallel over the targets, if Numba is installed
+# Otherwise the NumPy direct summation is used
+class NumbaSolver (Solver):
+
+    # The number of bodies in each tile of the NumPy direct summation
+    tile_size = 256
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, **kwargs):
+        super().__init__("numba", **kwargs)
+        self.direct = DirectSolver(tile_size = self.tile_size, softening = self.softening, kernel = self.kernel)
+
+    # Calculates the accelerations and potentials of the target particles
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+        if not kernels.NUMBA:
+            return self.direct.evaluate(particles, targets)
+        targets = self.get_targets(particles, targets)
+        sources = particles.sources
+
+        # The plummer softening is added to the squared distance, and the spline is used within its length
+        spline = self.kernel == "spline" and self.softening > 0
+        return kernels.gravity(particles.x[targets], particles.x[sources], particles.mass[sources], \
+            0.0 if spline else self.softening ** 2, self.SPLINE_LENGTH * self.softening if spline else 0.0)
+
+    ##########################################################################
+
+
+
+
+
+# Multi-process direct summation solver
+# Splits the targets between a pool of worker processes that persists for an integration
+# The positions, masses and results are stored in shared memory, so only the target ranges are sent
+class ProcessSolver (Solver):
+
+    # The number of worker processes, or None to use all the cores
+    processes = None
+
+    # The number of target chunks given to each process per evaluation
+    chunks_per_process = 4
+
+    # The number of bodies in each tile of the workers' direct summation
+    tile_size = 256
+
+    # The worker state, which is only set inside the worker processes
+    worker = {}
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, **kwargs):
+        super().__init__("process", **kwargs)
+        self.pool = None
+        self.memory = []
+        self.direct = DirectSolver(tile_size = self.tile_size, softening = self.softening, kernel = self.kernel)
+
+    # Creates the shared arrays and starts the worker processes
+    def start (self, particles: Particles, threads: int = None):
+        self.stop(particles)
+
+        # Move the positions and masses into shared memory and create the shared results
+        particles.x = self.share(particles.x)
+        particles.mass = self.share(particles.mass)
+        self.a = self.share(np.zeros((particles.n, 3)))
+        self.pot = self.share(np.zeros(particles.n))
+        self.x = particles.x
+
+        # Start the workers, which attach to the shared memory once
+        # The workers are spawned, as forking after the compiled kernels have started their threads can hang
+        names = [(shm.name, array.shape, array.dtype.str) for shm, array in zip(self.memory, [particles.x, particles.mass, self.a, self.pot])]
+        self.n_processes = self.processes if self.processes else os.cpu_count()
+        self.pool = get_context("spawn").Pool(self.n_processes, initializer=ProcessSolver.worker_start, \
+            initargs=(names, particles.has_mass, self.direct))
+
+    # Stops the worker processes and moves the arrays out of shared memory
+    def stop (self, particles: Particles):
+        if self.pool is None: return
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+
+        # Copy the arrays back into private memory and release the shared memory
+        particles.x = np.array(particles.x)
+        particles.mass = np.array(particles.mass)
+        self.x = self.a = self.pot = None
+        for shm in self.memory:
+            shm.close()
+            shm.unlink()
+        self.memory = []
+
+    # Returns a copy of some array stored in a new block of shared memory
+    def share (self, array: np.ndarray) -> np.ndarray:
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+        shared[:] = array
+        self.memory.append(shm)
+        return shared
+
+
+    # Calculates the accelerations and potentials of the target particles
+    # Without a running pool, or for a subset of targets, the evaluation is not split
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+        if self.pool is None or targets is not None:
+            return self.direct.evaluate(particles, targets)
+
+        # Copy the positions into shared memory if the arrays have been replaced
+        if particles.x is not self.x:
+            self.x[:] = particles.x
+
+        # Split the targets into chunks and wait for the workers to write the results
+        n_chunks = min(particles.n, self.n_processes * self.chunks_per_process)
+        bounds = np.linspace(0, particles.n, n_chunks + 1).astype(int)
+        self.pool.map(ProcessSolver.worker_evaluate, list(zip(bounds[:-1], bounds[1:])))
+
+        # Return copies of the accelerations and potentials
+        return np.array(self.a), np.array(self.pot)
+
+
+    ##########################################################################
+    # Worker Functions
+
+    # Attaches a worker process to the shared memory
+    @staticmethod
+    def worker_start (names: list, has_mass: np.ndarray, solver: Solver):
+        arrays = []
+        for name, shape, dtype in names:
+            shm = shared_memory.SharedMemory(name=name)
+            arrays.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+            ProcessSolver.worker.setdefault("memory", []).append(shm)
+
+        # Store the shared arrays as particles for the direct solver
+        x, mass, a, pot = arrays
+        ProcessSolver.worker["particles"] = Particles.from_arrays(x, mass, has_mass)
+        ProcessSolver.worker["a"] = a
+        ProcessSolver.worker["pot"] = pot
+        ProcessSolver.worker["solver"] = solver
+
+    # Evaluates a range of targets and writes the results into shared memory
+    @staticmethod
+    def worker_evaluate (bounds: tuple):
+        lo, hi = bounds
+        worker = ProcessSolver.worker
+        a, pot = worker["solver"].evaluate(worker["particles"], np.arange(lo, hi))
+        worker["a"][lo:hi] = a
+        worker["pot"][lo:hi] = pot
+
+    ##########################################################################
+
+
+
+
+
+# Multi-threaded direct summation solver
+# Splits the targets into chunks that are evaluated by a pool of threads
+# The tiles are large NumPy operations which release the GIL, so the threads run in parallel
+class ThreadSolver (Solver):
+
+    # The number of threads, or None to use all the cores
+    threads = None
+
+    # The number of target chunks given to each thread per evaluation
+    chunks_per_thread = 4
+
+    # The number of bodies in each tile of the direct summation
+    tile_size = 256
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, **kwargs):
+        super().__init__("thread", **kwargs)
+        self.pool = None
+        self.direct = DirectSolver(tile_size = self.tile_size, softening = self.softening, kernel = self.kernel)
+
+    # Starts the threads, which can be overridden by the number of threads from the integrator
+    def start (self, particles: Particles, threads: int = None):
+        self.stop(particles)
+        self.n_threads = threads if threads else (self.threads if self.threads else os.cpu_count())
+        self.pool = ThreadPoolExecutor(self.n_threads)
+
+    # Stops the threads
+    def stop (self, particles: Particles):
+        if self.pool is None: return
+        self.pool.shutdown()
+        self.pool = None
+
+    # Calculates the accelerations and potentials of the target particles
+    # Without a running pool, the evaluation is not split
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+        if self.pool is None:
+            return self.direct.evaluate(particles, targets)
+        targets = self.get_targets(particles, targets)
+        a = np.zeros((len(targets), 3))
+        pot = np.zeros(len(targets))
+
+        # Split the targets into chunks and wait for the threads to fill the results
+        n_chunks = max(1, min(len(targets), self.n_threads * self.chunks_per_thread))
+        bounds = np.linspace(0, len(targets), n_chunks + 1).astype(int)
+        def evaluate_chunk (lo: int, hi: int):
+            a[lo:hi], pot[lo:hi] = self.direct.evaluate(particles, targets[lo:hi])
+        list(self.pool.map(evaluate_chunk, bounds[:-1], bounds[1:]))
+
+        return a, pot
+
+    ##########################################################################
+
+
+
+
+
+# Direct summation solver for an ensemble of independent systems with the same number of bodies
+# The bodies of each member are consecutive rows of the particles, and only feel the sources in their own member
+# The members are evaluated together in batches, which bounds the memory used
+class EnsembleSolver (Solver):
+
+    # The number of members in the ensemble
+    members = 1
+
+    # The number of pairs of bodies in each batch of members
+    batch_size = 65536
+
+
+    ##########################################################################
+    # Solver Functions
+
+    # Initialise the solver
+    def __init__ (self, **kwargs):
+        super().__init__("ensemble", **kwargs)
+
+    # Calculates the accelerations and potentials of the target particles
+    def evaluate (self, particles: Particles, targets = None) -> tuple:
+        targets = self.get_targets(particles, targets)
+        if particles.sources.size == 0: return np.zeros((targets.size, 3)), np.zeros(targets.size)
+
+        # View the particles as the bodies of each member (K, N)
+        n = particles.n // self.members
+        x = particles.x.reshape(self.members, n, 3)
+        mass = (-1.0 * G * particles.mass * particles.has_mass).reshape(self.members, n)
+        a = np.zeros((self.members, n, 3))
+        pot = np.zeros((self.members, n))
+
+        # Calculate the effects of the sources in each member on the bodies of that member
+        batch = max(1, self.batch_size // max(n * n, 1))
+        for lo in range(0, self.members, batch):
+            members = slice(lo, lo + batch)
+            distance = x[members, :, np.newaxis, :] - x[members, np.newaxis, :, :]
+            inv, inv3 = self.soften(np.einsum("kijl,kijl->kij", distance, distance))
+            pot[members] = np.einsum("kij,kj->ki", inv, mass[members])
+            a[members] = np.einsum("kij,kijl->kil", inv3 * mass[members, np.newaxis, :], distance)
+
+        # Return the accelerations and potentials of the targets
+        return a.reshape(-1, 3)[targets], pot.reshape(-1)[targets]
+
+    ##########################################################################
+
+
+
+
+
+# Stores the solvers that can be selected by key
+SOLVER_KEYS = {
+    "direct":   DirectSolver,
+    "tree":     TreeSolver,
+    "fmm":      FMMSolver,
+    "mesh":     MeshSolver,
+    "numba":    NumbaSolver,
+    "process":  ProcessSolver,
+    "thread":   ThreadSolver,
+}
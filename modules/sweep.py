@@ -0,0 +1,276 @@
+import os
+import copy
+import signal
+import itertools
+import contextlib
+from time import perf_counter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from .time import Time
+from .cluster import Cluster
+from .system import System
+from .vector import Vector
+from .model import *
+from .integrator import *
+from .color import Color
+
+
+
+# Runs a grid of simulations in a pool of processes, where each run is written to its own directory
+# Each run is isolated, so a failed, slow or crashed run does not stop the other runs
+class Sweep:
+
+    ##########################################################################
+    # PARAMETERS
+    ##########################################################################
+
+    # The parameters of the runs, as a dictionary of lists that are combined into every possible run
+    # A list of dictionaries can also be given, with the parameters of each run
+    grid = {}
+
+    # The function that creates the system, time and integrator of a run from its parameters
+    # This must be defined at the top level of a module, so that it can be sent to the processes
+    build = None
+
+    # The directory that the runs are written to, with a directory for each run
+    directory = "sweep/"
+
+    # The number of processes, which defaults to the number of cores
+    processes = None
+
+    # The longest duration of a run in seconds, or None to not limit the runs
+    timeout = None
+
+    # The number of times a run is restarted after its process is lost
+    retries = 1
+
+    # The results of each run, in the order of the runs
+    results: list = []
+
+    # The parameters of a run that are not given, which match the parameters of the main script
+    # The parameters of each model are given by MODEL_DEFAULTS
+    DEFAULTS = {
+        "model":            "kepler",
+        "n_bodies":         1,
+        "radius":           1.0,
+        "use_background":   True,
+        "masses":           [1],
+        "vel_vec":          Vector(0, 1, 0),
+        "dt":               0.01,
+        "output_dt":        0.01,
+        "tmax":             10,
+        "integrator":       LeapFrogIntegrator,
+    }
+
+
+    ##########################################################################
+    # SWEEP FUNCTIONS
+    ##########################################################################
+
+    # Creates a new sweep over some grid of parameters
+    def __init__ (self, grid, **kwargs):
+        self.grid = grid
+        self.__dict__.update(kwargs)
+
+
+    # Returns the parameters of every run
+    def get_runs (self) -> list:
+        if isinstance(self.grid, list):
+            return [dict(params) for params in self.grid]
+        keys = list(self.grid.keys())
+        return [dict(zip(keys, values)) for values in itertools.product(*self.grid.values())]
+
+
+    # Executes every run in the pool of processes and writes the summary table
+    # Each process has its own executor, so a crashed process only loses its own run, which is restarted
+    def run (self) -> list:
+        runs = self.get_runs()
+        build = self.build if self.build is not None else Sweep.create
+        os.makedirs(self.directory, exist_ok = True)
+        Color.print("\nRunning Sweep of %d Runs..." % len(runs), Color.WARNING)
+
+        # Start a run on each process, so that every core is kept busy
+        results = {}
+        attempts = [0] * len(runs)
+        queue = deque(range(len(runs)))
+        running = {}
+        for slot in range(min(self.processes or os.cpu_count() or 1, len(runs))):
+            executor = ProcessPoolExecutor(max_workers = 1)
+            idx = queue.popleft()
+            running[executor.submit(Sweep.execute, build, runs[idx], idx, self.directory, self.timeout)] = (executor, idx)
+
+        # Collect the results and start the next runs as the processes finish
+        while len(running) > 0:
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in done:
+                executor, idx = running.pop(future)
+                try:
+                    results[idx] = future.result()
+
+                # Replace the lost process, and restart the run unless it has been restarted too many times
+                except BrokenProcessPool:
+                    executor.shutdown()
+                    executor = ProcessPoolExecutor(max_workers = 1)
+                    attempts[idx] += 1
+                    if attempts[idx] > self.retries:
+                        results[idx] = Sweep.get_result(idx, "crashed", error = "The process of the run was lost.")
+                    else:
+                        queue.append(idx)
+                except Exception as error:
+                    results[idx] = Sweep.get_result(idx, "failed", error = str(error))
+
+                # Start the next run on the process
+                if len(queue) > 0:
+                    idx = queue.popleft()
+                    running[executor.submit(Sweep.execute, build, runs[idx], idx, self.directory, self.timeout)] = (executor, idx)
+                else:
+                    executor.shutdown()
+
+        # Store the results with the parameters of each run
+        self.results = [{**results[idx], **runs[idx]} for idx in range(len(runs))]
+        self.write_summary()
+        self.report()
+        return self.results
+
+
+    # Returns the result of a run with some status
+    # The energy errors are the error of the system and the largest error of the bodies
+    @staticmethod
+    def get_result (idx: int, status: str, duration: float = 0.0, E_err: float = np.nan, E_err_body: float = np.nan, error: str = "") -> dict:
+        return {"run": idx, "status": status, "duration": duration, "E_err": E_err, "E_err_body": E_err_body, "error": error}
+
+
+    # Returns the directory of a run
+    @staticmethod
+    def get_directory (directory: str, idx: int) -> str:
+        return directory + "run_" + str(idx).zfill(5) + "/"
+
+
+
+    ##########################################################################
+    # RUN FUNCTIONS
+    ##########################################################################
+
+    # Executes a single run inside a process, and returns its result
+    # The output of the integrator is written to a log in the directory of the run
+    @staticmethod
+    def execute (build, params: dict, idx: int, directory: str, timeout: float = None) -> dict:
+        directory = Sweep.get_directory(directory, idx)
+        os.makedirs(directory, exist_ok = True)
+        start = perf_counter()
+
+        # Limit the duration of the run with an alarm, where the alarm is supported
+        alarm = timeout is not None and hasattr(signal, "SIGALRM")
+        if alarm:
+            signal.signal(signal.SIGALRM, Sweep.interrupt)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+
+        # Run the integration, catching any errors
+        try:
+            with open(directory + "log.txt", "w") as log, contextlib.redirect_stdout(log):
+                system, time, integrator = build(params)
+                integrator.verbose = False
+                integrator.directory = directory + "output/"
+                integrator.initial_file = directory + "initial.dat"
+                integrator.checkpoint_file = directory + "checkpoint.dat"
+                integrator.execute(system, time, "body.dat", output_timestep = params.get("output_dt", Sweep.DEFAULTS["output_dt"]))
+            return Sweep.get_result(idx, "done", perf_counter() - start, system.E_err, max([body.E_error for body in system.bodies]))
+        except TimeoutError:
+            return Sweep.get_result(idx, "timeout", perf_counter() - start, error = "The run took longer than %g s." % timeout)
+        except Exception as error:
+            return Sweep.get_result(idx, "failed", perf_counter() - start, error = str(error))
+        finally:
+            if alarm: signal.setitimer(signal.ITIMER_REAL, 0)
+
+    # Stops a run that has taken longer than the timeout
+    @staticmethod
+    def interrupt (signum, frame):
+        raise TimeoutError()
+
+
+    # Returns whether some class has a parameter with some name, which is not a function
+    @staticmethod
+    def has_parameter (cls, key: str) -> bool:
+        return hasattr(cls, key) and not callable(getattr(cls, key))
+
+    # Creates the system, time and integrator of a run in the same way as the main script
+    # The parameters are given to the model, cluster, system or integrator that has an attribute with the same name
+    # The parameters are copied, as the objects can change them and a process is reused for many runs
+    @staticmethod
+    def create (params: dict) -> tuple:
+        params = copy.deepcopy({**Sweep.DEFAULTS, **params})
+        model = params.pop("model")
+        if isinstance(model, str):
+            if model.lower() not in MODEL_KEYS:
+                raise Exception("Invalid model name used.")
+            model = MODEL_KEYS[model.lower()]
+        params = {**MODEL_DEFAULTS.get(model, {}), **params}
+        integrator = params.pop("integrator")
+        time = Time(0, params.pop("tmax"), params.pop("dt"))
+        params.pop("output_dt")
+
+        # Split the remaining parameters between the objects
+        args = {"model": {}, "cluster": {}, "system": {}, "integrator": {}}
+        for key, value in params.items():
+            if Sweep.has_parameter(model, key): args["model"][key] = value
+            elif Sweep.has_parameter(Cluster, key): args["cluster"][key] = value
+            elif Sweep.has_parameter(System, key): args["system"][key] = value
+            elif Sweep.has_parameter(integrator, key): args["integrator"][key] = value
+            else: raise Exception("Invalid sweep parameter used.")
+
+        # Create the objects
+        cluster = Cluster(model(**args["model"]), **args["cluster"])
+        system = System(cluster, **args["system"])
+        return system, time, integrator(**args["integrator"])
+
+
+
+    ##########################################################################
+    # SUMMARY FUNCTIONS
+    ##########################################################################
+
+    # Returns a parameter or result as text for the summary table
+    @staticmethod
+    def format_value (value) -> str:
+        if isinstance(value, type): return value.__name__
+        if isinstance(value, (float, np.floating)): return "%.6g" % value
+        return str(value).replace("\t", " ").replace("\n", " ")
+
+    # Writes the summary table of the results, with a row for each run
+    def write_summary (self):
+        keys = []
+        for result in self.results:
+            keys.extend([key for key in result if key not in keys])
+        with open(self.directory + "summary.dat", "w") as file:
+            file.write("\t".join(keys) + "\n")
+            for result in self.results:
+                file.write("\t".join([self.format_value(result.get(key, "")) for key in keys]) + "\n")
+
+    # Outputs the number of runs with each status
+    def report (self):
+        Color.print("\nSweep Complete!", Color.SUCCESS)
+        for status in ["done", "failed", "timeout", "crashed"]:
+            count = len([result for result in self.results if result["status"] == status])
+            if count > 0: print("\t%s: %d" % (status.capitalize(), count))
+        print("\tSummary: %s" % (self.directory + "summary.dat"))
+
+
+
+
+# Stores the models that can be selected by name
+MODEL_KEYS = {
+    "kepler":       KeplerModel,
+    "isochrone":    IsochroneModel,
+    "oscillator":   OscillatorModel,
+    "logarithmic":  LogarithmicModel,
+}
+
+# Stores the parameters of each model that are not given, which match the parameters of the main script
+MODEL_DEFAULTS = {
+    KeplerModel:        {"a": 1.0, "e": 0.6, "v_mul": 1.0},
+    IsochroneModel:     {"b": 0.1, "v_esc": 0.5},
+    OscillatorModel:    {"rho": 0.5},
+    LogarithmicModel:   {"v0": 1.0, "Rc": 0.2, "q": 0.8, "v_mul": 0.5},
+}
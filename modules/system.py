@@ -1,3 +1,4 @@
+import numpy as np
 from numpy import float64
 from .cluster import Cluster
 from .constants import *
@@ -5,6 +6,8 @@ from .model import Model
 from .body import Body
 from .vector import Vector
 from .state import State
+from .particles import Particles
+from .solver import Solver
 from .initial_conditions import InitialConditions
 
 # Stores information related to the system
@@ -26,6 +29,12 @@ class System:
     # A list of all bodies
     bodies: list = []
 
+    # The particle arrays that the bodies are views onto
+    particles: Particles = None
+
+    # The gravity solver, or the key of the solver to use
+    solver: Solver = "direct"
+
 
     ##############################
     # Calculated Properties
@@ -60,6 +69,7 @@ class System:
     def __init__ (self, clusters: list, **kwargs):
         self.clusters = clusters if type(clusters) is list and len(clusters) != 1 else [clusters]
         self.__dict__.update(kwargs)
+        self.solver = Solver.create(self.solver)
         self.reset()
 
 
@@ -81,11 +91,14 @@ class System:
         # Gets the number of bodies
         self.n_bodies = len(self.bodies)
 
+        # Stores the bodies in the particle arrays
+        self.particles = Particles(self.bodies)
+
+        # Sets the starting accelerations and potentials of the bodies
+        self.particles.a[:], self.particles.PE[:] = self.compute_forces()
+
         # Sets the starting properties of the bodies
-        for idx in range(self.n_bodies):
-            # Update the potential and reset the body
-            self.bodies[idx].PE = self.get_potential(idx)
-            self.bodies[idx].reset()
+        self.update_bodies(reset = True)
 
 
     # Updates the properties of the system
@@ -98,6 +111,37 @@ class System:
         self.get_system_E_error()
 
 
+    # Updates the properties of all bodies from the particle arrays in a single vectorised pass
+    # Resetting the bodies also sets their initial energies
+    def update_bodies (self, reset: bool = False):
+        particles = self.particles
+        x, v, mass = particles.x, particles.v, particles.mass
+
+        # Calculate the properties of all bodies
+        r = np.sqrt(np.einsum("ij,ij->i", x, x))
+        theta = np.arctan2(x[:, 1], x[:, 0])
+        L = np.cross(x, v) * mass[:, np.newaxis]
+        KE = 0.5 * mass * np.einsum("ij,ij->i", v, v)
+        E = KE + particles.PE
+
+        # Calculate the energy errors from the initial energies
+        if reset: particles.E_init = E.copy()
+        E_error = np.zeros(particles.n)
+        nonzero = particles.E_init != 0.0
+        E_error[nonzero] = np.abs((particles.E_init[nonzero] - E[nonzero]) / particles.E_init[nonzero])
+
+        # Copy the properties to the bodies
+        for idx, body in enumerate(self.bodies):
+            body.r = r[idx]
+            body.theta = theta[idx]
+            body.L = Vector(*L[idx].tolist())
+            body.KE = KE[idx]
+            body.PE = particles.PE[idx]
+            body.E = E[idx]
+            body.E_error = E_error[idx]
+            body.init_energy = particles.E_init[idx]
+
+
     # Returns the output data for the file
     def output (self) -> str:
         return "%8.4f\t%s\t%8.4f\t%8.4f\t%8.4f\t%8.4f" % \
@@ -131,19 +175,18 @@ class System:
         for cluster in self.clusters:
             if cluster.use_background:
                 a += cluster.model.acceleration(body.state.x)
-              
+
         # Calculate the effects of all bodies
-        for idx in range(self.n_bodies):
-            if idx != body_idx and self.bodies[idx].has_mass:
-                distance: Vector = body.state.x - self.bodies[idx].state.x
-                mag = distance.mag
-                a_fac = (-1.0 * G * self.bodies[idx].mass) / (mag ** 3) if mag > 0 else 0.0
-                a += a_fac * distance
+        a += Vector(*self.solver.accelerations(self.particles, body_idx)[0].tolist())
 
         # Return the acceleration
         return a
 
-    
+
+    # Calculates the acceleration vectors of all bodies in a single batched evaluation
+    def compute_accelerations (self) -> np.ndarray:
+        return self.compute_forces()[0]
+
     # Calculates the potential of some body
     def get_potential (self, body_idx: int) -> float64:
 
@@ -156,17 +199,74 @@ class System:
             if cluster.use_background:
                 pot += cluster.model.potential(body.position)
 
-        # Loop through all bodies
-        for idx in range(self.n_bodies):
-            if idx != body_idx and self.bodies[idx].has_mass:
-                # Add the potential to the data
-                mass = -1.0 * G * body.mass * self.bodies[idx].mass
-                mag = (body.position - self.bodies[idx].position).mag
-                pot += mass / mag if mag > 0 else 0.0
+        # Add the potential from all bodies
+        pot += body.mass * float(self.solver.potentials(self.particles, body_idx)[0])
 
         # Return the potential over the mass
         return pot / body.mass if body.mass > 0 else 0.0
 
+
+    # Calculates the potentials of all bodies in a single batched evaluation
+    def compute_potentials (self) -> np.ndarray:
+        return self.compute_forces()[1]
+
+
+    # Calculates the accelerations and potentials of all bodies in a single fused evaluation
+    # Some target bodies can be given to only calculate their accelerations and potentials
+    def compute_forces (self, targets = None) -> tuple:
+        mass = self.particles.mass[self.solver.get_targets(self.particles, targets)]
+
+        # Add the background and the effects of all bodies
+        a, pot = self.get_background_forces(targets)
+        a_bodies, pot_bodies = self.solver.evaluate(self.particles, targets)
+        a += a_bodies
+        pot += mass * pot_bodies
+
+        # Return the accelerations and the potentials over the masses
+        return a, np.divide(pot, mass, out=np.zeros(mass.size), where=mass > 0)
+
+
+    # Calculates the accelerations, jerks and potentials of all bodies in a single fused evaluation
+    def compute_jerks (self) -> tuple:
+        mass = self.particles.mass
+
+        # Add the background and the effects of all bodies
+        a, pot = self.get_background_forces()
+        jerk = self.get_background_jerks()
+        a_bodies, jerk_bodies, pot_bodies = self.solver.evaluate_jerk(self.particles)
+        a += a_bodies
+        jerk += jerk_bodies
+        pot += mass * pot_bodies
+
+        # Return the accelerations, jerks and the potentials over the masses
+        return a, jerk, np.divide(pot, mass, out=np.zeros(self.n_bodies), where=mass > 0)
+
+
+    # Calculates the background jerks of all bodies
+    def get_background_jerks (self) -> np.ndarray:
+        jerk = np.zeros((self.n_bodies, 3))
+        for cluster in self.clusters:
+            if cluster.use_background:
+                jerk += cluster.model.jerk(self.particles.x, self.particles.v)
+        return jerk
+
+
+    # Calculates the background accelerations and potentials of some target bodies, or all bodies
+    def get_background_forces (self, targets = None) -> tuple:
+        x = self.particles.x if targets is None else self.particles.x[self.solver.get_targets(self.particles, targets)]
+        a = np.zeros((len(x), 3))
+        pot = np.zeros(len(x))
+
+        # Add in elements from each cluster's background, evaluated for all bodies at once
+        for cluster in self.clusters:
+            if cluster.use_background:
+                a_model, pot_model = cluster.model.evaluate(x)
+                a += a_model
+                pot += pot_model
+
+        # Return the accelerations and potentials
+        return a, pot
+
     
     # Calculates the current system total angular momentum
     def get_system_L (self) -> Vector: